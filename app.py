@@ -1,18 +1,66 @@
+import asyncio
 import os
 import discord
 
 from dotenv import load_dotenv
 from discord.ext import commands
-from utils.database import add_database_member, add_database_guild, log_to_database
+from utils.database import add_database_guild, close_database, flush_logs, get_special_channel_ids, log_to_database, start_guild_cache_watcher
+from utils.dispatcher import MessageDispatcher
 from utils.message import send_message
-
-
-def main():
-
+from utils.metrics import MetricsServer, add_stats, instrument_http, timed_listener
+from utils.recording import GatewayRecorder
+from utils.routing import route_guild, unroute_guild
+
+
+class Muskrat(commands.Bot):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.message_dispatcher = MessageDispatcher()
+        self.recorder = None
+        self.metrics_server = None
+
+        # Export metrics of listeners, REST requests and message handlers
+        instrument_http(self.http)
+        add_stats('message_handler', self.message_dispatcher.stats)
+
+    def _schedule_event(self, coro, event_name, *args, **kwargs):
+        """Schedules an event listener, recording how long it takes."""
+        return super()._schedule_event(timed_listener(coro), event_name, *args, **kwargs)
+
+    async def on_message(self, message):
+        """Runs the message handlers of the cogs and any command in the message."""
+        await asyncio.gather(
+            self.message_dispatcher.dispatch(message),
+            self.process_commands(message)
+        )
+
+    async def close(self):
+        """
+        Lets cogs save their state, writes queued logs, closes the bot, the database connection pool,
+        then any recording and the metrics server, even if an earlier step failed.
+        """
+        try:
+            for cog in self.cogs.values():
+                if hasattr(cog, 'flush'):
+                    await cog.flush()
+            await flush_logs()
+
+            await super().close()
+            close_database()
+        finally:
+            if self.recorder is not None:
+                self.recorder.close()
+            if self.metrics_server is not None:
+                await self.metrics_server.stop()
+
+
+def create_bot() -> Muskrat:
+    """Creates the bot with its commands, events and cogs."""
     # Create the bot
     intents = discord.Intents.default()
     intents.members = True
-    bot = commands.Bot(command_prefix='!!', intents=intents, help_command=None)
+    bot = Muskrat(command_prefix='!!', intents=intents, help_command=None)
     bot.embed_color = 0x00C700
 
     # Help Command
@@ -67,22 +115,41 @@ def main():
     @bot.event
     async def on_ready():
         """Confirms bot is online."""
+        await asyncio.gather(*(route(guild) for guild in bot.guilds))
         print('Muskrat is online.')
         await bot.change_presence(activity=discord.Game(name='Watching over my territory.'))
 
     @bot.event
     async def on_guild_join(guild):
         """Adds a guild to the database."""
-        add_database_guild(guild)
+        await add_database_guild(guild)
+        route_guild(guild)
+
+    @bot.event
+    async def on_guild_remove(guild):
+        """Forgets the special channels of a guild."""
+        unroute_guild(guild)
+
+    # Special channels without a configured id are found by name, so they can change with any channel
+    @bot.event
+    async def on_guild_channel_create(channel):
+        await route(channel.guild)
+
+    @bot.event
+    async def on_guild_channel_update(before, after):
+        await route(after.guild)
 
     @bot.event
-    async def on_member_join(member):
-        """Adds a member to the database when they join a guild."""
-        add_database_member(member)
+    async def on_guild_channel_delete(channel):
+        await route(channel.guild)
+
+    async def route(guild):
+        """Registers the special channels of a guild."""
+        route_guild(guild, await get_special_channel_ids(guild))
 
     @bot.command()
     async def test(ctx, args):
-        log_to_database(ctx.guild, 'Test log 1')
+        await log_to_database(ctx.guild, 'Test log 1')
 
     # Load the cogs
     bot.load_extension('cogs.around_the_world')
@@ -94,8 +161,24 @@ def main():
     bot.load_extension('cogs.private_vc')
     bot.load_extension('cogs.reaction_role')
 
-    # Run the Bot
+    return bot
+
+
+def main():
     load_dotenv()
+    bot = create_bot()
+
+    # Record gateway traffic to replay it with benchmarks/replay.py
+    if os.environ.get('GATEWAY_RECORDING'):
+        bot.recorder = GatewayRecorder(bot, os.environ['GATEWAY_RECORDING'])
+
+    # Serve metrics for Prometheus
+    if os.environ.get('METRICS_PORT'):
+        bot.metrics_server = MetricsServer()
+        bot.loop.run_until_complete(bot.metrics_server.start(os.environ.get('METRICS_HOST', '127.0.0.1'), int(os.environ['METRICS_PORT'])))
+
+    # Run the Bot
+    start_guild_cache_watcher()
     bot.run(os.environ.get('BOT_TOKEN'))
 
 
@@ -0,0 +1,79 @@
+"""
+Measures banned word matching throughput.
+
+Compares the old per-word substring loop with the compiled pattern from utils.matcher
+for guilds with 10, 1k and 10k banned phrases, in substring and whole word mode.
+Also measures the cost of normalizing messages on their own.
+
+Usage: python -m benchmarks.banned_words
+"""
+import random
+import string
+import time
+
+from utils.matcher import WordMatcher, normalize
+
+
+MESSAGE_COUNT = 2000
+WORD_COUNTS = (10, 1_000, 10_000)
+
+
+def random_word(rng: random.Random) -> str:
+    """Returns a random lowercase word, sometimes made of two words."""
+    word = ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10)))
+    if rng.random() < 0.2:
+        word += ' ' + ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 8)))
+    return word
+
+
+def random_message(rng: random.Random) -> str:
+    """Returns a chat message of a few short words, sometimes written to evade filters."""
+    message = ' '.join(''.join(rng.choices(string.ascii_letters, k=rng.randint(1, 8))) for _ in range(rng.randint(3, 30)))
+    if rng.random() < 0.2:
+        message = '\u200b'.join(message)
+    if rng.random() < 0.2:
+        message = message.replace('a', '\u0430').replace('o', '0') + ' \U0001f600'
+    return message
+
+
+def naive_matches(words: list[str], text: str) -> bool:
+    """The previous implementation of BannedWords.on_message."""
+    for word in words:
+        if word.lower() in text.lower():
+            return True
+    return False
+
+
+def run(label: str, func, messages: list[str]) -> None:
+    """Prints the throughput of func over messages."""
+    start = time.perf_counter()
+    for message in messages:
+        func(message)
+    elapsed = time.perf_counter() - start
+    print(f'  {label:<10} {len(messages) / elapsed:>12,.0f} msg/s  {elapsed / len(messages) * 1e6:>10.1f} us/msg')
+
+
+def main():
+    rng = random.Random(0)
+    messages = [random_message(rng) for _ in range(MESSAGE_COUNT)]
+
+    print('normalization only')
+    run('normalize', normalize, messages)
+
+    for word_count in WORD_COUNTS:
+        words = [random_word(rng) for _ in range(word_count)]
+        matcher = WordMatcher()
+
+        start = time.perf_counter()
+        matcher.get_pattern(0, words)
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        print(f'{word_count} banned words (compiled in {compile_ms:.1f} ms)')
+        run('naive', lambda message: naive_matches(words, message), messages)
+        run('substring', lambda message: matcher.matches(0, words, message), messages)
+        matcher.get_pattern(1, words, whole_words=True)
+        run('word', lambda message: matcher.matches(1, words, message, whole_words=True), messages)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Measures the size and decode time of the guild documents read for each event.
+
+Compares the whole guild document that get_guild_data() returned with the projected fields read by the
+per-feature accessors in utils.database, for a guild with many banned words and Reaction Roles.
+Sizes are of the BSON documents sent by the server, decode time is that of bson.decode(), which pymongo runs
+for every document it receives.
+
+Usage: python -m benchmarks.guild_fields
+"""
+import random
+import string
+import time
+
+import bson
+
+from bson.objectid import ObjectId
+from utils.database import BANNED_WORDS_FIELDS, COUNTING_COUNT_FIELDS, LEAVE_FIELDS, SPECIAL_CHANNEL_FIELDS, WELCOME_FIELDS
+
+
+DECODE_COUNT = 20_000
+BANNED_WORD_COUNT = 500
+REACTION_ROLE_COUNT = 50
+PAIRS_PER_REACTION_ROLE = 10
+
+# Guild document fields read by each event
+EVENTS = {
+    'member leave': LEAVE_FIELDS,
+    'member join': WELCOME_FIELDS,
+    'message': BANNED_WORDS_FIELDS,
+    'channel update': SPECIAL_CHANNEL_FIELDS,
+    'counting load': COUNTING_COUNT_FIELDS
+}
+
+
+def random_id(rng: random.Random) -> int:
+    """Returns a random Discord snowflake."""
+    return rng.randrange(10 ** 17, 10 ** 18)
+
+
+def random_guild(rng: random.Random) -> dict:
+    """Returns a guild document with every field a guild can have."""
+    return {
+        "_id": ObjectId(),
+        "guild_id": random_id(rng),
+        "welcome_channel_id": random_id(rng),
+        "welcome_message": "Read the rules and grab some roles!",
+        "welcome_role_id": random_id(rng),
+        "leave_channel_id": random_id(rng),
+        "counting_channel_id": random_id(rng),
+        "counting_count": rng.randrange(100_000),
+        "around_the_world_channel_id": random_id(rng),
+        "banned_words": [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10))) for _ in range(BANNED_WORD_COUNT)],
+        "banned_words_mode": "substring",
+        "reaction_roles": [
+            {
+                "message_id": random_id(rng),
+                "role-emoji_pairs": [
+                    {"emoji": '\U0001f600', "role_id": random_id(rng)}
+                    for _ in range(PAIRS_PER_REACTION_ROLE)
+                ]
+            }
+            for _ in range(REACTION_ROLE_COUNT)
+        ]
+    }
+
+
+def project(document: dict, fields: tuple) -> dict:
+    """Returns the document the server sends for a find_one() projected to fields."""
+    return {field: value for field, value in document.items() if field == '_id' or field in fields}
+
+
+def run(label: str, document: dict) -> None:
+    """Prints the size and decode time of a document."""
+    data = bson.encode(document)
+    start = time.perf_counter()
+    for _ in range(DECODE_COUNT):
+        bson.decode(data)
+    elapsed = time.perf_counter() - start
+    print(f'  {label:<10} {len(data):>8,} bytes  {elapsed / DECODE_COUNT * 1e6:>8.2f} us/decode')
+
+
+def main():
+    rng = random.Random(0)
+    guild_data = random_guild(rng)
+
+    for event, fields in EVENTS.items():
+        print(event)
+        run('before', guild_data)
+        run('after', project(guild_data, fields))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,648 @@
+"""
+Replays synthetic Discord events through the bot without a connection to Discord.
+
+The bot is created with app.create_bot(). Its HTTP client is replaced by FakeDiscord, which answers every REST
+request after a simulated round trip and sends back the gateway events Discord would send, such as CHANNEL_CREATE
+after a channel is created. Gateway events are fed to the bot through the same parsers its websocket uses.
+The database is a local MongoDB, or mongomock with --in-process.
+
+A configurable mix of events is sent at a fixed rate: numbers in #counting, chat messages checked for banned words,
+messages in #around-the-world, Reaction Role reactions, voice joins and leaves of 'Create Private VC' and member joins.
+Reports throughput, latency percentiles of every listener, database calls and commands, and REST calls by route.
+
+Never point --mongo-uri at a production database: the load test writes to it.
+
+Usage: python -m benchmarks.load_test [--rate 200] [--duration 10] [--mix counting=4,message=4,...] [--in-process]
+"""
+import argparse
+import asyncio
+import copy
+import datetime
+import itertools
+import os
+import random
+import re
+import time
+
+from collections import Counter, defaultdict
+
+import discord
+
+from pymongo import monitoring
+
+
+DEFAULT_MIX = 'counting=4,message=4,around_the_world=1,reaction=2,voice=1,join=1'
+BANNED_WORDS = ['spoiler', 'cheat code', 'free nitro']
+REACTION_EMOJI = '\U0001f44d'
+
+# Tasks that run for as long as the bot does, and are not waited for when the bot is idle
+BACKGROUND_TASKS = {'Loop._loop', '_write_logs'}
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts the commands pymongo sends to MongoDB."""
+
+    def __init__(self):
+        self.commands = Counter()
+        self.failures = Counter()
+
+    def started(self, event):
+        self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        self.failures[event.command_name] += 1
+
+
+class FakeGateway:
+    """Stands in for the websocket of a bot, which only sends presence updates."""
+
+    open = False
+
+    async def change_presence(self, *, activity=None, status=None, afk=False, since=0.0):
+        pass
+
+
+class FakeDiscord:
+    """
+    Stands in for the Discord API and gateway of a bot.
+
+    REST requests are answered after latency seconds and counted by route. Listener latency is measured from the
+    moment discord.py schedules a listener to the moment it returns.
+    """
+
+    def __init__(self, bot, latency: float):
+        self.bot = bot
+        self.latency = latency
+        self.ids = itertools.count(discord.utils.time_snowflake(datetime.datetime.utcnow()))
+        self.channels = {}
+        self.rest_calls = Counter()
+        self.events = Counter()
+        self.listener_latencies = defaultdict(list)
+        self.listener_errors = Counter()
+        self.listener_tasks = set()
+
+        bot.http.request = self.request
+        bot.ws = FakeGateway()
+        self._schedule_event = bot._schedule_event
+        bot._schedule_event = self.schedule_event
+
+    def next_id(self) -> int:
+        return next(self.ids)
+
+    def dispatch(self, event: str, data: dict) -> None:
+        """Sends a gateway dispatch to the bot, keeping track of channels."""
+        if event == 'GUILD_CREATE':
+            for channel in data.get('channels', []):
+                self.channels[int(channel['id'])] = dict(channel, guild_id=data['id'])
+        elif event in ('CHANNEL_CREATE', 'CHANNEL_UPDATE') and 'guild_id' in data:
+            self.channels[int(data['id'])] = data
+        elif event == 'CHANNEL_DELETE':
+            self.channels.pop(int(data['id']), None)
+
+        self.events[event] += 1
+        self.bot._connection.parsers[event](copy.deepcopy(data))
+
+    def reset_stats(self) -> None:
+        """Forgets the latencies and calls recorded so far."""
+        self.listener_latencies.clear()
+        self.listener_errors.clear()
+        self.rest_calls.clear()
+        self.events.clear()
+
+    def schedule_event(self, coro, event_name, *args, **kwargs):
+        """Schedules a listener like discord.py does, timing it."""
+        name = getattr(coro, '__qualname__', event_name)
+        scheduled_at = time.perf_counter()
+
+        async def timed(*args, **kwargs):
+            try:
+                await coro(*args, **kwargs)
+            except Exception:
+                self.listener_errors[name] += 1
+                raise
+            finally:
+                self.listener_latencies[name].append(time.perf_counter() - scheduled_at)
+
+        timed.__qualname__ = name
+        task = self._schedule_event(timed, event_name, *args, **kwargs)
+        self.listener_tasks.add(task)
+        task.add_done_callback(self.listener_tasks.discard)
+        return task
+
+    async def wait_until_idle(self, timeout: float) -> bool:
+        """Waits until every listener and task started by one has finished. Returns False on timeout."""
+        deadline = time.perf_counter() + timeout
+        current = asyncio.current_task()
+        while time.perf_counter() < deadline:
+            busy = [
+                task for task in asyncio.all_tasks()
+                if task is not current and task.get_coro().__qualname__ not in BACKGROUND_TASKS
+            ]
+            if not busy:
+                return True
+            await asyncio.wait(busy, timeout=0.05)
+
+        return False
+
+    async def request(self, route, *, files=None, form=None, **kwargs):
+        """Answers a REST request like Discord would."""
+        self.rest_calls[f'{route.method} {route.path}'] += 1
+        await asyncio.sleep(self.latency)
+
+        handler = getattr(self, f'{route.method.lower()}_{route.path.strip("/").replace("/", "_").replace("{", "").replace("}", "")}', None)
+        if handler is None:
+            return None
+
+        return handler(get_route_parameters(route), kwargs.get('json') or {})
+
+    def post_channels_channel_id_messages(self, parameters: dict, data: dict) -> dict:
+        """Sends a message and the MESSAGE_CREATE event for it."""
+        channel = self.channels[parameters['channel_id']]
+        me = self.bot.get_guild(int(channel['guild_id'])).me
+        author = member_payload(me.id, me.name, [role.id for role in me.roles if not role.is_default()])
+        payload = message_payload(self.next_id(), channel, author['user'], author, data.get('content') or '')
+        self.dispatch('MESSAGE_CREATE', payload)
+        return payload
+
+    def get_channels_channel_id_messages(self, parameters: dict, data: dict) -> list:
+        """Returns the channel history, which is always empty."""
+        return []
+
+    def delete_channels_channel_id_messages_message_id(self, parameters: dict, data: dict) -> None:
+        """Deletes a message and sends the MESSAGE_DELETE event for it."""
+        channel = self.channels[parameters['channel_id']]
+        self.dispatch('MESSAGE_DELETE', {"id": str(parameters['message_id']), "channel_id": channel['id'], "guild_id": channel['guild_id']})
+
+    def post_guilds_guild_id_channels(self, parameters: dict, data: dict) -> dict:
+        """Creates a channel and sends the CHANNEL_CREATE event for it."""
+        payload = channel_payload(self.next_id(), parameters['guild_id'], data['name'], data['type'], data.get('parent_id'))
+        payload['permission_overwrites'] = data.get('permission_overwrites', [])
+        self.dispatch('CHANNEL_CREATE', payload)
+        return payload
+
+    def patch_channels_channel_id(self, parameters: dict, data: dict) -> dict:
+        """Edits a channel and sends the CHANNEL_UPDATE event for it."""
+        payload = dict(self.channels[parameters['channel_id']], **data)
+        self.dispatch('CHANNEL_UPDATE', payload)
+        return payload
+
+    def delete_channels_channel_id(self, parameters: dict, data: dict) -> dict:
+        """Deletes a channel and sends the CHANNEL_DELETE event for it."""
+        payload = self.channels[parameters['channel_id']]
+        self.dispatch('CHANNEL_DELETE', payload)
+        return payload
+
+    def patch_guilds_guild_id_members_user_id(self, parameters: dict, data: dict) -> None:
+        """Edits a member and sends the GUILD_MEMBER_UPDATE or VOICE_STATE_UPDATE event for it."""
+        guild_id = parameters['guild_id']
+        member = self.bot.get_guild(guild_id).get_member(parameters['user_id'])
+        if member is None:
+            return None
+
+        if 'roles' in data:
+            self.dispatch('GUILD_MEMBER_UPDATE', {
+                "guild_id": str(guild_id),
+                "user": user_payload(member.id, member.name),
+                "roles": [str(role_id) for role_id in data['roles']],
+                "nick": member.nick,
+                "joined_at": (member.joined_at or datetime.datetime.utcnow()).isoformat()
+            })
+        if 'channel_id' in data:
+            self.dispatch('VOICE_STATE_UPDATE', voice_state_payload(guild_id, data['channel_id'], member_payload(member.id, member.name)))
+
+    def put_guilds_guild_id_members_user_id_roles_role_id(self, parameters: dict, data: dict) -> None:
+        """Gives a member a role and sends the GUILD_MEMBER_UPDATE event for it."""
+        self.edit_member_role(parameters, add=True)
+
+    def delete_guilds_guild_id_members_user_id_roles_role_id(self, parameters: dict, data: dict) -> None:
+        """Removes a role from a member and sends the GUILD_MEMBER_UPDATE event for it."""
+        self.edit_member_role(parameters, add=False)
+
+    def edit_member_role(self, parameters: dict, add: bool) -> None:
+        """Adds or removes the role of a role route like the member edit route would."""
+        member = self.bot.get_guild(parameters['guild_id']).get_member(parameters['user_id'])
+        if member is None:
+            return
+
+        role_ids = {role.id for role in member.roles if not role.is_default()}
+        if add:
+            role_ids.add(parameters['role_id'])
+        else:
+            role_ids.discard(parameters['role_id'])
+        self.patch_guilds_guild_id_members_user_id(parameters, {"roles": list(role_ids)})
+
+
+class SyntheticGuild:
+    """A guild with every special channel set up, and the events its members send."""
+
+    def __init__(self, discord: FakeDiscord, member_count: int, rng: random.Random):
+        self.discord = discord
+        self.rng = rng
+        self.id = discord.next_id()
+        self.next_count = 1
+
+        # Roles
+        self.bot_role_id = discord.next_id()
+        self.welcome_role_id = discord.next_id()
+        self.reaction_role_id = discord.next_id()
+
+        # Channels
+        self.general_id = discord.next_id()
+        self.counting_id = discord.next_id()
+        self.around_the_world_id = discord.next_id()
+        self.roles_id = discord.next_id()
+        self.voice_category_id = discord.next_id()
+        self.create_private_vc_id = discord.next_id()
+        self.reaction_role_message_id = discord.next_id()
+
+        self.members = [(discord.next_id(), f'member{index}') for index in range(member_count)]
+
+    def guild_data(self) -> dict:
+        """Returns the guild document."""
+        return {
+            "guild_id": self.id,
+            "welcome_channel_id": self.general_id,
+            "welcome_message": "Read the rules!",
+            "welcome_role_id": self.welcome_role_id,
+            "leave_channel_id": self.general_id,
+            "counting_channel_id": self.counting_id,
+            "around_the_world_channel_id": self.around_the_world_id,
+            "banned_words": BANNED_WORDS,
+            "banned_words_mode": "substring",
+            "reaction_roles": [{
+                "message_id": self.reaction_role_message_id,
+                "role-emoji_pairs": [{"emoji": REACTION_EMOJI, "role_id": self.reaction_role_id}]
+            }]
+        }
+
+    def guild_create(self, bot_user: dict) -> dict:
+        """Returns the GUILD_CREATE payload of the guild."""
+        channels = [
+            channel_payload(self.general_id, self.id, 'general', discord.ChannelType.text.value),
+            channel_payload(self.counting_id, self.id, 'counting', discord.ChannelType.text.value),
+            channel_payload(self.around_the_world_id, self.id, 'around-the-world', discord.ChannelType.text.value),
+            channel_payload(self.roles_id, self.id, 'roles', discord.ChannelType.text.value),
+            channel_payload(self.voice_category_id, self.id, 'Voice', discord.ChannelType.category.value),
+            channel_payload(self.create_private_vc_id, self.id, 'Create Private VC', discord.ChannelType.voice.value, self.voice_category_id)
+        ]
+
+        bot_member = member_payload(int(bot_user['id']), bot_user['username'], [self.bot_role_id])
+        bot_member['user'] = bot_user
+        return {
+            "id": str(self.id),
+            "name": 'Load Test',
+            "owner_id": bot_user['id'],
+            "region": 'us-east',
+            "afk_timeout": 300,
+            "verification_level": 0,
+            "default_message_notifications": 0,
+            "explicit_content_filter": 0,
+            "mfa_level": 0,
+            "features": [],
+            "roles": [
+                role_payload(self.id, '@everyone', 0),
+                role_payload(self.bot_role_id, 'Muskrat', discord.Permissions.all().value),
+                role_payload(self.welcome_role_id, 'Member', 0),
+                role_payload(self.reaction_role_id, 'Reactor', 0)
+            ],
+            "emojis": [],
+            "channels": channels,
+            "members": [bot_member] + [member_payload(member_id, name) for member_id, name in self.members],
+            "voice_states": [],
+            "presences": [],
+            "member_count": len(self.members) + 1,
+            "large": False,
+            "unavailable": False
+        }
+
+    def random_member(self) -> tuple:
+        return self.rng.choice(self.members)
+
+    def message(self, channel_id: int, content: str) -> tuple:
+        member_id, name = self.random_member()
+        return 'MESSAGE_CREATE', message_payload(
+            self.discord.next_id(), self.discord.channels[channel_id], user_payload(member_id, name), member_payload(member_id, name), content
+        )
+
+    def counting(self) -> tuple:
+        """A number in #counting, one in ten of them wrong."""
+        if self.rng.random() < 0.1:
+            return self.message(self.counting_id, str(self.next_count + 1))
+
+        self.next_count += 1
+        return self.message(self.counting_id, str(self.next_count - 1))
+
+    def chat(self) -> tuple:
+        """A message in #general, one in twenty of them with a banned word."""
+        words = [self.rng.choice(['hello', 'how', 'are', 'you', 'today', 'nice', 'game', 'lol']) for _ in range(self.rng.randint(2, 20))]
+        if self.rng.random() < 0.05:
+            words.append(self.rng.choice(BANNED_WORDS))
+        return self.message(self.general_id, ' '.join(words))
+
+    def around_the_world(self) -> tuple:
+        """A message in #around-the-world, one in ten of them breaking the chain."""
+        return self.message(self.around_the_world_id, 'Around the World' if self.rng.random() < 0.9 else 'around the block')
+
+    def reaction(self) -> tuple:
+        """Adds or removes a reaction on the Reaction Role message."""
+        member_id, name = self.random_member()
+        payload = {
+            "user_id": str(member_id),
+            "channel_id": str(self.roles_id),
+            "message_id": str(self.reaction_role_message_id),
+            "guild_id": str(self.id),
+            "emoji": {"id": None, "name": REACTION_EMOJI}
+        }
+        if self.rng.random() < 0.5:
+            return 'MESSAGE_REACTION_REMOVE', payload
+
+        payload['member'] = member_payload(member_id, name)
+        return 'MESSAGE_REACTION_ADD', payload
+
+    def voice(self) -> tuple:
+        """Joins 'Create Private VC', or leaves voice if the member is already in a channel."""
+        member_id, name = self.random_member()
+        member = self.discord.bot.get_guild(self.id).get_member(member_id)
+        channel_id = None if member.voice and member.voice.channel else self.create_private_vc_id
+        return 'VOICE_STATE_UPDATE', voice_state_payload(self.id, channel_id, member_payload(member_id, name))
+
+    def join(self) -> tuple:
+        """A new member joins the guild."""
+        member = (self.discord.next_id(), f'member{len(self.members)}')
+        self.members.append(member)
+        payload = member_payload(*member)
+        payload['guild_id'] = str(self.id)
+        return 'GUILD_MEMBER_ADD', payload
+
+
+def get_route_parameters(route) -> dict:
+    """Returns the ids in the URL of a route by parameter name."""
+    pattern = re.sub(r'\\{(\w+)\\}', r'(?P<\1>\\d+)', re.escape(route.path)) + '$'
+    match = re.search(pattern, route.url.split('?')[0])
+    return {name: int(value) for name, value in match.groupdict().items()} if match else {}
+
+
+def user_payload(user_id: int, name: str, bot=False) -> dict:
+    return {"id": str(user_id), "username": name, "discriminator": '0001', "avatar": None, "bot": bot}
+
+
+def member_payload(user_id: int, name: str, roles=()) -> dict:
+    return {
+        "user": user_payload(user_id, name),
+        "roles": [str(role_id) for role_id in roles],
+        "nick": None,
+        "joined_at": datetime.datetime.utcnow().isoformat(),
+        "deaf": False,
+        "mute": False
+    }
+
+
+def role_payload(role_id: int, name: str, permissions: int) -> dict:
+    return {
+        "id": str(role_id), "name": name, "permissions": str(permissions), "position": 0,
+        "color": 0, "hoist": False, "managed": False, "mentionable": False
+    }
+
+
+def channel_payload(channel_id: int, guild_id: int, name: str, channel_type: int, parent_id=None) -> dict:
+    return {
+        "id": str(channel_id),
+        "guild_id": str(guild_id),
+        "name": name,
+        "type": channel_type,
+        "position": 0,
+        "parent_id": str(parent_id) if parent_id else None,
+        "permission_overwrites": [],
+        "nsfw": False,
+        "topic": None,
+        "last_message_id": None,
+        "rate_limit_per_user": 0,
+        "bitrate": 64000,
+        "user_limit": 0
+    }
+
+
+def message_payload(message_id: int, channel: dict, author: dict, member: dict, content: str) -> dict:
+    member = dict(member)
+    member.pop('user', None)
+    return {
+        "id": str(message_id),
+        "channel_id": channel['id'],
+        "guild_id": channel['guild_id'],
+        "author": author,
+        "member": member,
+        "content": content,
+        "timestamp": datetime.datetime.utcnow().isoformat(),
+        "edited_timestamp": None,
+        "tts": False,
+        "mention_everyone": False,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [],
+        "pinned": False,
+        "type": 0
+    }
+
+
+def voice_state_payload(guild_id: int, channel_id: int, member: dict) -> dict:
+    return {
+        "guild_id": str(guild_id),
+        "channel_id": str(channel_id) if channel_id else None,
+        "user_id": member['user']['id'],
+        "member": member,
+        "session_id": 'load-test',
+        "deaf": False,
+        "mute": False,
+        "self_deaf": False,
+        "self_mute": False,
+        "self_video": False,
+        "suppress": False
+    }
+
+
+def parse_mix(mix: str) -> dict:
+    """Parses 'kind=weight,...' into weights by event kind."""
+    weights = {}
+    for item in mix.split(','):
+        kind, _, weight = item.partition('=')
+        weights[kind.strip()] = float(weight or 1)
+    return weights
+
+
+def use_in_process_database() -> None:
+    """Makes utils.database use mongomock instead of a MongoDB server."""
+    try:
+        import mongomock
+    except ImportError:
+        raise SystemExit('--in-process needs mongomock, install it with "pip install mongomock".')
+
+    import utils.database
+    utils.database.MongoClient = mongomock.MongoClient
+
+
+def count_database_calls() -> Counter:
+    """Counts the blocking functions run by utils.database on its thread pool."""
+    import utils.database
+    calls = Counter()
+    run_in_database = utils.database.run_in_database
+
+    async def counted(func, *args, **kwargs):
+        calls[func.__name__] += 1
+        return await run_in_database(func, *args, **kwargs)
+
+    utils.database.run_in_database = counted
+    return calls
+
+
+async def start_bot(fake: FakeDiscord, guilds: list) -> None:
+    """Logs the bot in to the synthetic guilds and dispatches on_ready."""
+    from utils.database import get_database, run_in_database
+
+    bot = fake.bot
+    bot_user = user_payload(fake.next_id(), 'Muskrat', bot=True)
+    bot._connection.user = discord.ClientUser(state=bot._connection, data=bot_user)
+
+    for guild in guilds:
+        await run_in_database(lambda: get_database()['guilds'].insert_one(guild.guild_data()))
+        fake.dispatch('GUILD_CREATE', guild.guild_create(bot_user))
+
+    bot.dispatch('ready')
+    await fake.wait_until_idle(timeout=30)
+
+
+async def stop_bot(fake: FakeDiscord, guild_ids=()) -> None:
+    """Closes the bot and deletes the documents of the guilds with guild_ids."""
+    from utils.database import close_database, get_database, run_in_database
+
+    await fake.bot.close()
+
+    def delete_guilds():
+        database = get_database()
+        for collection in ('guilds', 'members', 'logs', 'private_vcs'):
+            database[collection].delete_many({"guild_id": {"$in": list(guild_ids)}})
+
+    if guild_ids:
+        await run_in_database(delete_guilds)
+    close_database()
+
+
+def percentile(values: list, percent: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def report(fake: FakeDiscord, sent: int, send_time: float, elapsed: float, database_calls: Counter, command_counter: CommandCounter) -> None:
+    """Prints throughput, listener latency, database usage and REST calls."""
+    print(f'Sent {sent} events in {send_time:.2f} s, the bot finished handling them after {elapsed:.2f} s ({sent / elapsed:,.0f} events/s)')
+
+    print('\nListener latency (ms)')
+    print(f'  {"listener":<48} {"calls":>7} {"p50":>8} {"p95":>8} {"p99":>8} {"max":>8} {"errors":>7}')
+    for name, latencies in sorted(fake.listener_latencies.items()):
+        print(
+            f'  {name:<48} {len(latencies):>7} {percentile(latencies, 50) * 1000:>8.1f} {percentile(latencies, 95) * 1000:>8.1f} '
+            f'{percentile(latencies, 99) * 1000:>8.1f} {max(latencies) * 1000:>8.1f} {fake.listener_errors[name]:>7}'
+        )
+
+    print('\nMessage handlers (ms)')
+    for name, stats in sorted(fake.bot.message_dispatcher.stats.items()):
+        print(f'  {name:<48} {stats["calls"]:>7} mean {stats["total_time"] / stats["calls"] * 1000:>8.2f} max {stats["max_time"] * 1000:>8.2f}')
+
+    print('\nDatabase calls')
+    for name, count in database_calls.most_common():
+        print(f'  {name:<48} {count:>7}')
+
+    if command_counter.commands:
+        print('\nDatabase commands')
+        for name, count in command_counter.commands.most_common():
+            print(f'  {name:<48} {count:>7} ({command_counter.failures[name]} failed)')
+
+    print('\nREST calls')
+    for route, count in fake.rest_calls.most_common():
+        print(f'  {route:<48} {count:>7}')
+
+    print('\nGateway events')
+    for event, count in fake.events.most_common():
+        print(f'  {event:<48} {count:>7}')
+
+
+async def run(bot, args) -> None:
+    rng = random.Random(args.seed)
+    fake = FakeDiscord(bot, args.latency)
+    guilds = [SyntheticGuild(fake, args.members, rng) for _ in range(args.guilds)]
+    await start_bot(fake, guilds)
+
+    weights = parse_mix(args.mix)
+    kinds = list(weights)
+    fake.reset_stats()
+    args.database_calls.clear()
+    args.command_counter.commands.clear()
+
+    # Send events at a fixed rate, falling behind if the bot hogs the event loop
+    event_count = int(args.rate * args.duration)
+    start = time.perf_counter()
+    for index in range(event_count):
+        delay = start + index / args.rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        guild = rng.choice(guilds)
+        kind = rng.choices(kinds, [weights[kind] for kind in kinds])[0]
+        fake.dispatch(*getattr(guild, 'chat' if kind == 'message' else kind)())
+    send_time = time.perf_counter() - start
+
+    if not await fake.wait_until_idle(timeout=args.timeout):
+        print(f'Gave up waiting for the bot after {args.timeout} s.')
+    elapsed = time.perf_counter() - start
+
+    report(fake, event_count, send_time, elapsed, args.database_calls, args.command_counter)
+    await stop_bot(fake, [guild.id for guild in guilds])
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """Adds the options of the fake Discord and database."""
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds to answer a REST request')
+    parser.add_argument('--timeout', type=float, default=60, help='seconds to wait for the bot to finish')
+    parser.add_argument('--mongo-uri', default='mongodb://localhost:27017', help='MongoDB used by the bot')
+    parser.add_argument('--in-process', action='store_true', help='use mongomock instead of MongoDB')
+
+
+def create_test_bot(args):
+    """Points the database at the load test database, then creates the bot on a new event loop."""
+    # Set before the bot loads the .env file, which does not override variables that are already set
+    os.environ['MONGO_URI'] = args.mongo_uri
+    os.environ.setdefault('MONGO_CHANGE_STREAM', '')
+    if args.in_process:
+        use_in_process_database()
+
+    args.command_counter = CommandCounter()
+    monitoring.register(args.command_counter)
+    args.database_calls = count_database_calls()
+
+    # Cogs start their loops on the current event loop when they are loaded
+    asyncio.set_event_loop(asyncio.new_event_loop())
+
+    from app import create_bot
+    return create_bot()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replays synthetic Discord events through the bot.')
+    parser.add_argument('--rate', type=float, default=200, help='events per second')
+    parser.add_argument('--duration', type=float, default=10, help='seconds to send events for')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help='relative weights of the event kinds')
+    parser.add_argument('--guilds', type=int, default=1, help='number of guilds')
+    parser.add_argument('--members', type=int, default=1000, help='members per guild')
+    parser.add_argument('--seed', type=int, default=0)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    bot = create_test_bot(args)
+    bot.loop.run_until_complete(run(bot, args))
+
+
+if __name__ == '__main__':
+    main()
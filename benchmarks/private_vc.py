@@ -0,0 +1,171 @@
+"""
+Measures how long members wait between joining 'Create Private VC' and being moved into their private VC.
+
+Discord and the database are replaced by fakes that answer every REST request after ROUND_TRIP seconds
+and allow one channel creation per guild every CREATE_INTERVAL seconds, like a route rate limit.
+Compares the previous sequential implementation, concurrent channel creation, and claiming from
+pre-warmed pools of different sizes, for a single join and for a wave of members joining at once.
+
+Usage: python -m benchmarks.private_vc
+"""
+import asyncio
+import itertools
+import statistics
+import time
+
+import cogs.private_vc as private_vc_module
+
+from cogs.private_vc import PrivateVC
+
+
+ROUND_TRIP = 0.08
+CREATE_INTERVAL = 0.25
+DATABASE_ROUND_TRIP = 0.002
+WAVE_SIZES = (1, 10)
+POOL_SIZES = (1, 10)
+
+_ids = itertools.count(1)
+
+
+class FakeChannel:
+    """A voice channel whose REST calls take ROUND_TRIP seconds."""
+
+    def __init__(self, guild, name, category):
+        self.id = next(_ids)
+        self.guild = guild
+        self.name = name
+        self.category = category
+        self.members = []
+
+    async def edit(self, **options):
+        await asyncio.sleep(ROUND_TRIP)
+        self.name = options.get('name', self.name)
+
+    async def delete(self):
+        await asyncio.sleep(ROUND_TRIP)
+        self.guild.channels.pop(self.id, None)
+
+
+class FakeGuild:
+    """A guild that allows one channel creation every CREATE_INTERVAL seconds."""
+
+    def __init__(self):
+        self.id = next(_ids)
+        self.default_role = object()
+        self.channels = {}
+        self._create_lock = asyncio.Lock()
+        self._next_create = 0.0
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    async def create_voice_channel(self, name, category=None, overwrites=None):
+        async with self._create_lock:
+            delay = self._next_create - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_create = time.perf_counter() + CREATE_INTERVAL
+
+        await asyncio.sleep(ROUND_TRIP)
+        channel = FakeChannel(self, name, category)
+        self.channels[channel.id] = channel
+        return channel
+
+
+class FakeCategory:
+
+    def __init__(self):
+        self.id = next(_ids)
+
+
+class FakeMember:
+    """A member that records when they were moved."""
+
+    def __init__(self, guild):
+        self.id = next(_ids)
+        self.guild = guild
+        self.name = f'member{self.id}'
+        self.nick = None
+        self.moved = asyncio.Event()
+
+    async def move_to(self, channel):
+        await asyncio.sleep(ROUND_TRIP)
+        channel.members.append(self)
+        self.moved.set()
+
+
+async def fake_add_database_private_vc(guild, owner_id, private_channel, waiting_channel):
+    await asyncio.sleep(DATABASE_ROUND_TRIP)
+    return {
+        "guild_id": guild.id,
+        "owner_id": owner_id,
+        "private_channel_id": private_channel.id,
+        "waiting_channel_id": waiting_channel.id
+    }
+
+
+async def fake_claim_database_private_vc(owner, private_channel_id):
+    await asyncio.sleep(DATABASE_ROUND_TRIP)
+    return True
+
+
+async def fake_delete_database_private_vc(guild, private_channel_id):
+    await asyncio.sleep(DATABASE_ROUND_TRIP)
+
+
+async def sequential_private_vc(cog, member, category):
+    """The previous implementation of PrivateVC.on_voice_state_update."""
+    guild = member.guild
+    private_vc = await guild.create_voice_channel(f'Private - {member.name}', category=category)
+    waiting_vc = await guild.create_voice_channel(f'Waiting - {member.name}', category=category)
+    cog.private_vcs[private_vc.id] = await fake_add_database_private_vc(guild, member.id, private_vc, waiting_vc)
+    await member.move_to(private_vc)
+
+
+async def wait_for_background_tasks() -> None:
+    """Waits for pool replenishment started by the previous wave."""
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    if tasks:
+        await asyncio.gather(*tasks)
+
+
+async def run(label: str, create, wave_size: int, pool_size=0) -> None:
+    """Prints the join-to-move latency of a wave of members joining at the same time."""
+    cog = PrivateVC(None)
+    cog.pool_size = pool_size
+    guild = FakeGuild()
+    category = FakeCategory()
+
+    if pool_size:
+        await cog.fill_pool(guild, category)
+
+    members = [FakeMember(guild) for _ in range(wave_size)]
+    latencies = []
+
+    async def join(member):
+        start = time.perf_counter()
+        asyncio.ensure_future(create(cog, member, category))
+        await member.moved.wait()
+        latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(join(member) for member in members))
+    await wait_for_background_tasks()
+
+    print(f'  {label:<12} mean {statistics.mean(latencies) * 1000:>7.0f} ms  max {max(latencies) * 1000:>7.0f} ms')
+
+
+async def main():
+    private_vc_module.add_database_private_vc = fake_add_database_private_vc
+    private_vc_module.claim_database_private_vc = fake_claim_database_private_vc
+    private_vc_module.delete_database_private_vc = fake_delete_database_private_vc
+
+    for wave_size in WAVE_SIZES:
+        print(f'{wave_size} member(s) joining (round trip {ROUND_TRIP * 1000:.0f} ms, one create per {CREATE_INTERVAL * 1000:.0f} ms)')
+        await run('sequential', sequential_private_vc, wave_size)
+        await run('concurrent', PrivateVC.create_private_vc, wave_size)
+        for pool_size in POOL_SIZES:
+            await run(f'pool of {pool_size}', PrivateVC.create_private_vc, wave_size, pool_size)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,126 @@
+"""
+Replays a gateway recording made with GATEWAY_RECORDING through the bot, against the fake Discord of benchmarks.load_test.
+
+The READY, GUILD_CREATE and GUILD_MEMBERS_CHUNK events at the start of the recording set up the guilds, then on_ready
+runs and the rest of the events are sent with their recorded timing, sped up by --speed, or as fast as possible
+with --speed max. Reports the same metrics as benchmarks.load_test.
+
+Guilds without a document in the database get a default one, so replay against a scratch database, such as
+--in-process or a local copy of the production database. Messages the bot sent itself are not replayed, since
+the fake Discord sends them again when the bot sends them. Other events the bot caused, such as channels it
+created, are replayed as recorded in addition to the ones the fake Discord sends.
+
+Usage: python -m benchmarks.replay recording-[time]-[pid].ndjson.gz [--speed 1|10|max] [--in-process]
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import time
+import zlib
+
+import discord
+
+from benchmarks.load_test import FakeDiscord, add_arguments, create_test_bot, report, stop_bot
+
+
+SETUP_EVENTS = {'READY', 'GUILD_CREATE', 'GUILD_MEMBERS_CHUNK'}
+
+
+def read_recording(path: str) -> list:
+    """Returns the events of a recording. A recording cut short, for example by a crash, is read up to its last complete event."""
+    events = []
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            for line in file:
+                if line.endswith('\n') and line.strip():
+                    events.append(json.loads(line))
+    except (EOFError, zlib.error, gzip.BadGzipFile) as e:
+        print(f'The recording is cut short, replaying the {len(events)} events before the end: {e}')
+
+    return events
+
+
+async def add_missing_guilds(bot) -> None:
+    """Adds a default document for every guild that has none."""
+    from utils.database import add_database_guild, get_database, run_in_database
+
+    def get_guild_ids():
+        return {guild_data['guild_id'] for guild_data in get_database()['guilds'].find({}, {"_id": False, "guild_id": True})}
+
+    guild_ids = await run_in_database(get_guild_ids)
+    for guild in bot.guilds:
+        if guild.id not in guild_ids:
+            await add_database_guild(guild)
+
+
+async def run(bot, args) -> None:
+    events = read_recording(args.recording)
+    setup_count = next((index for index, event in enumerate(events) if event['t'] not in SETUP_EVENTS), len(events))
+    setup, events = events[:setup_count], events[setup_count:]
+
+    ready = next((event['d'] for event in setup if event['t'] == 'READY'), None)
+    if ready is None:
+        raise SystemExit('The recording does not start with a READY event.')
+
+    # Log in to the recorded guilds. Members come from the recorded chunks, the fake gateway can't send more.
+    fake = FakeDiscord(bot, args.latency)
+    bot._connection.user = discord.ClientUser(state=bot._connection, data=ready['user'])
+    bot._connection._chunk_guilds = False
+    for event in setup:
+        if event['t'] == 'GUILD_CREATE':
+            event['d']['unavailable'] = False
+        if event['t'] != 'READY':
+            fake.dispatch(event['t'], event['d'])
+
+    await add_missing_guilds(bot)
+    bot.dispatch('ready')
+    await fake.wait_until_idle(timeout=args.timeout)
+    fake.reset_stats()
+    args.database_calls.clear()
+    args.command_counter.commands.clear()
+
+    # Send the events at their recorded times, or as fast as possible
+    speed = None if args.speed == 'max' else float(args.speed)
+    parsers = bot._connection.parsers
+    sent = 0
+    first = events[0]['time'] if events else 0.0
+    start = time.perf_counter()
+    for event in events:
+        if event['t'] not in parsers:
+            continue
+        if event['t'] == 'MESSAGE_CREATE' and event['d']['author']['id'] == ready['user']['id']:
+            continue
+
+        if speed is None:
+            await asyncio.sleep(0)
+        else:
+            delay = start + (event['time'] - first) / speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        fake.dispatch(event['t'], event['d'])
+        sent += 1
+    send_time = time.perf_counter() - start
+
+    if not await fake.wait_until_idle(timeout=args.timeout):
+        print(f'Gave up waiting for the bot after {args.timeout} s.')
+    elapsed = time.perf_counter() - start
+
+    report(fake, sent, send_time, elapsed, args.database_calls, args.command_counter)
+    await stop_bot(fake)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replays a gateway recording through the bot.')
+    parser.add_argument('recording', help='gzip compressed NDJSON file written with GATEWAY_RECORDING')
+    parser.add_argument('--speed', default='1', help='1, 10 or any other speed up of the recorded timing, or max')
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    bot = create_test_bot(args)
+    bot.loop.run_until_complete(run(bot, args))
+
+
+if __name__ == '__main__':
+    main()
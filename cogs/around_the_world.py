@@ -1,7 +1,10 @@
 import discord
 
 from discord.ext import commands
-from utils.message import delete_message, get_message, send_message
+from utils.channel import convert_to_channel
+from utils.database import get_special_channel_ids, update_database_guild
+from utils.message import delete_message, get_edited_message, is_content_edit, send_message
+from utils.routing import is_special_channel, route_guild
 
 
 class AroundTheWorld(commands.Cog):
@@ -9,8 +12,13 @@ class AroundTheWorld(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.subcommands = {
+            'channel': self.channel,
             'help': self.help,
         }
+        bot.message_dispatcher.add_handler(self.handle_message, channel_kind='around_the_world')
+
+    def cog_unload(self):
+        self.bot.message_dispatcher.remove_handler(self.handle_message)
 
     @commands.command(aliases=['atw'])
     async def around_the_world(self, ctx, command=None, *, args=None):
@@ -19,24 +27,47 @@ class AroundTheWorld(commands.Cog):
         if command in self.subcommands:
             await self.subcommands[command](ctx, args)
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
+    async def handle_message(self, message, context):
         """Filter messages."""
-        if message.channel.name != 'around-the-world':
-            return
-
         if message.content.lower() != 'around the world':
             await delete_message(message)
 
     @commands.Cog.listener()
     async def on_raw_message_edit(self, payload):
         """Prevent editing."""
+        if not is_special_channel(payload.channel_id, 'around_the_world') or not is_content_edit(payload):
+            return
+
         channel = self.bot.get_channel(payload.channel_id)
-        if channel.name != 'around-the-world':
+        await delete_message(get_edited_message(channel, payload))
+
+    @staticmethod
+    async def channel(ctx, args):
+        """Sets the around the world channel."""
+        guild = ctx.guild
+
+        # Check if the caller has permission
+        if not ctx.author.guild_permissions.administrator:
+            await send_message(ctx.channel, 'You don\'t have permission to use that command.')
             return
 
-        message = await get_message(channel, payload.message_id)
-        await delete_message(message)
+        # Get the around the world channel
+        channel = await convert_to_channel(ctx, args)
+        if channel is None:
+            await send_message(ctx.channel, f'Failed to parse "{args}" as a channel.')
+            return
+
+        # Update database
+        updated = await update_database_guild(
+            guild,
+            {"$set": {"around_the_world_channel_id": channel.id}},
+            'Failed to change around the world channel.'
+        )
+        if updated == False:
+            return
+        route_guild(guild, await get_special_channel_ids(guild))
+
+        await send_message(ctx.channel, f'Around The World channel successfully changed to {channel.mention}.')
 
     @staticmethod
     async def help(ctx, args):
@@ -45,7 +76,7 @@ class AroundTheWorld(commands.Cog):
         embed = discord.Embed(title='Around The World', color=ctx.bot.embed_color)
 
         description = '''
-        This Cog manages a channel with the name [#around-the-world].
+        This Cog manages a channel with the name [#around-the-world], or the channel set with the channel command.
 
         All messages sent with content other than 'around the world' are automatically deleted.
         '''
@@ -56,6 +87,10 @@ class AroundTheWorld(commands.Cog):
         `{prefix}atw help`
         Show this message.
         Required Permission: Everyone
+
+        `{prefix}atw channel [text channel]`
+        Sets [text channel] as the around the world channel.
+        Required Permission: Administrator
         '''
         embed.add_field(name='***Commands***', value=command_list, inline=False)
         
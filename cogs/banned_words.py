@@ -1,7 +1,8 @@
 import discord
 
 from discord.ext import commands
-from utils.database import get_guild_data, update_database_guild
+from utils.database import BANNED_WORDS_FIELDS, get_banned_words, update_database_guild
+from utils.matcher import WordMatcher
 from utils.message import delete_message, send_message
 
 
@@ -9,13 +10,20 @@ class BannedWords(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
+        self.matcher = WordMatcher()
         self.subcommands = {
             'add': self.add,
             'remove': self.remove,
             'list': self.list,
             'reset': self.reset,
+            'mode': self.mode,
             'help': self.help             
         }
+        # Members with Manage Messages are skipped, this allows the bot to list the banned words, or mods to use them in commands
+        bot.message_dispatcher.add_handler(self.handle_message, ignore_moderators=True, guild_fields=BANNED_WORDS_FIELDS)
+
+    def cog_unload(self):
+        self.bot.message_dispatcher.remove_handler(self.handle_message)
 
     @commands.command(aliases=['bw'])
     async def banned_words(self, ctx, command=None, *, args=None):
@@ -24,24 +32,17 @@ class BannedWords(commands.Cog):
         if command in self.subcommands:
             await self.subcommands[command](ctx, args)
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
+    async def handle_message(self, message, context):
         """Deletes a message if it contains a banned word."""
         guild = message.guild
-        # This allows the bot to list the banned words, or mods to use them in commands
-        if message.author.guild_permissions.manage_messages:
-            return
-
-        # Get the guild data from the database
-        guild_data = get_guild_data(guild)
+        guild_data = context.guild_data
         if guild_data is None:
             return
 
         # Delete the message if it contains a banned word
-        for word in guild_data['banned_words']:
-            if word.lower() in message.content.lower():
-                await delete_message(message)
-                return
+        whole_words = guild_data.get('banned_words_mode') == 'word'
+        if self.matcher.matches(guild.id, guild_data.get('banned_words', []), message.content, whole_words):
+            await delete_message(message)
 
     @staticmethod
     async def add(ctx, args):
@@ -59,7 +60,7 @@ class BannedWords(commands.Cog):
         word = args
 
         # Add the word to the database
-        updated = update_database_guild(
+        updated = await update_database_guild(
             guild,
             {"$push": {"banned_words": word}},
             'Failed to remove a banned word.'
@@ -83,7 +84,7 @@ class BannedWords(commands.Cog):
         word = args
 
         # Remove the word to the database
-        updated = update_database_guild(
+        updated = await update_database_guild(
             guild,
             {"$pull": {"banned_words": word}},
             'Failed to remove a banned word.'
@@ -101,13 +102,13 @@ class BannedWords(commands.Cog):
             await send_message(ctx.channel, 'You don\'t have permission to use that command.')
             return
 
-        # Get the guild data from the database
-        guild_data = get_guild_data(guild)
-        if guild_data is None:
+        # Get the banned words from the database
+        banned_words = await get_banned_words(guild)
+        if banned_words is None:
             return
 
         # Get the list of banned words
-        banned_words = sorted(guild_data['banned_words'])
+        banned_words = sorted(banned_words[0])
         words = ''
         for word in banned_words:
             words += word + '\n'
@@ -132,7 +133,7 @@ class BannedWords(commands.Cog):
             return
 
         # Update database
-        updated = update_database_guild(
+        updated = await update_database_guild(
             guild,
             {"$set": {"banned_words": []}},
             'Failed to reset banned words.'
@@ -140,6 +141,31 @@ class BannedWords(commands.Cog):
         if updated:
             await send_message(ctx.channel, 'Banned words have successfully been reset.')
 
+    @staticmethod
+    async def mode(ctx, args):
+        """Sets whether banned words match inside other words."""
+        guild = ctx.guild
+
+        # Check if the caller has permission
+        if not ctx.author.guild_permissions.manage_messages:
+            await send_message(ctx.channel, 'You don\'t have permission to use that command.')
+            return
+
+        # Get the mode
+        mode = (args or '').lower()
+        if mode not in ('word', 'substring'):
+            await send_message(ctx.channel, f'Failed to parse "{args}" as a mode. Use `word` or `substring`.')
+            return
+
+        # Update database
+        updated = await update_database_guild(
+            guild,
+            {"$set": {"banned_words_mode": mode}},
+            'Failed to change the banned words mode.'
+        )
+        if updated:
+            await send_message(ctx.channel, f'Banned words mode successfully changed to {mode}.')
+
     @staticmethod
     async def help(ctx, args):
         """Help Command."""
@@ -150,6 +176,7 @@ class BannedWords(commands.Cog):
         This Cog manages banned words throughout the server.
 
         If a message containing any banned words is sent by a member without the Manage Messages permission, it will be deleted.
+        Messages are checked ignoring case, accents, lookalike characters, leetspeak, punctuation and spaced out letters.
         '''
         embed.add_field(name='***Description***', value=description, inline=True)
 
@@ -174,6 +201,10 @@ class BannedWords(commands.Cog):
         `{prefix}bw reset`
         Resets the list of banned words.
         Required Permission: Manage Messages
+
+        `{prefix}bw mode [word|substring]`
+        `word` only matches banned words on their own, `substring` also matches them inside other words (default).
+        Required Permission: Manage Messages
         '''
         embed.add_field(name='***Commands***', value=command_list, inline=False)
 
@@ -1,9 +1,16 @@
+import asyncio
 import discord
+import math
+import os
 
-from discord.ext import commands
+from collections import defaultdict
+from discord.ext import commands, tasks
 from discord.errors import Forbidden, HTTPException
-from utils.database import add_database_member, get_guild_data, log_to_database, update_database_guild
-from utils.message import delete_message, get_message, send_message
+from pymongo.errors import PyMongoError
+from utils.database import buffer_member_count, count_database_members, flush_member_counts, get_counting_count, get_member_rank, get_special_channel_ids, get_top_member_counts, log_to_database, reset_member_counts, update_database_guild
+from utils.channel import convert_to_channel
+from utils.message import delete_message, get_edited_message, is_content_edit, send_message
+from utils.routing import get_special_channel, is_special_channel, route_guild
 
 
 class Counting(commands.Cog):
@@ -13,9 +20,36 @@ class Counting(commands.Cog):
         self.subcommands = {
             'leaderboard': self.leaderboard, 'lb': self.leaderboard,
             'reset': self.reset,
+            'channel': self.channel,
             'help': self.help
         }
 
+        # The last accepted number in each counting channel and the id of its message, by channel id.
+        # A count is dropped when its message is deleted, so that it is loaded from the channel history again.
+        self.counts = {}
+        self.last_message_ids = {}
+        self.count_locks = defaultdict(asyncio.Lock)
+        self.unsaved_channels = {}
+        self.save_counts.start()
+
+        # Member counts are buffered and written in bulk every COUNT_FLUSH_INTERVAL seconds,
+        # or as soon as COUNT_FLUSH_SIZE members have pending counts
+        self.flush_size = int(os.environ.get('COUNT_FLUSH_SIZE', 500))
+        self.write_member_counts.change_interval(seconds=float(os.environ.get('COUNT_FLUSH_INTERVAL', 10)))
+        self.write_member_counts.start()
+
+        bot.message_dispatcher.add_handler(self.handle_message, channel_kind='counting', ignore_bots=True)
+
+    def cog_unload(self):
+        self.bot.message_dispatcher.remove_handler(self.handle_message)
+        self.save_counts.cancel()
+        self.write_member_counts.cancel()
+
+    async def flush(self):
+        """Saves the current counts and pending member counts to the database."""
+        await self.save_counts()
+        await self.write_member_counts()
+
     @commands.command()
     async def counting(self, ctx, subcommand=None, *, args=None):
         """Manages subcommands."""
@@ -23,15 +57,10 @@ class Counting(commands.Cog):
         if subcommand in self.subcommands:
             await self.subcommands[subcommand](ctx, args)
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        """Deletes a message if it does not adhere to counting rules."""
+    async def handle_message(self, message, context):
+        """Deletes a message in #counting if it does not adhere to counting rules."""
         guild = message.guild
 
-        # Return if the message is not in #counting
-        if message.channel.name != 'counting' or message.author.bot:
-            return
-
         # Delete the message if it is not an integer
         try:
             message_int = int(message.content)
@@ -39,108 +68,166 @@ class Counting(commands.Cog):
             await delete_message(message)
             return
 
+        # Accept the message if it is one more than the previous number, messages are checked one at a time per channel
+        async with self.count_locks[message.channel.id]:
+            last_int = self.counts.get(message.channel.id)
+            if last_int is None:
+                last_int = await self.load_count(message)
+                if last_int is None:
+                    return
+
+            accepted = message_int == last_int+1
+            if accepted:
+                self.counts[message.channel.id] = message_int
+                self.last_message_ids[message.channel.id] = message.id
+                self.unsaved_channels[message.channel.id] = guild
+
+        # Return if the message is not one more than the previous message
+        if not accepted:
+            await delete_message(message)
+            return
+
+        # Update the member's count
+        if buffer_member_count(message.author) >= self.flush_size:
+            await flush_member_counts()
+
+    async def load_count(self, message):
+        """
+        Gets the number before message in its channel from the channel history, or from the database if that fails.
+
+        Returns the number or None.
+        """
+        guild = message.guild
+
         # Get the last message sent in the channel
         try:
-            history = message.channel.history(limit=2)
-            last_message = (await history.flatten())[1]
-            last_message_content = last_message.content
+            history = await message.channel.history(limit=1, before=message).flatten()
         except Forbidden as e:
-            log_to_database(guild, f'[{e.status} {e.response.reason}] Did not have permission to get channel history.')
-            return
+            await log_to_database(guild, f'[{e.status} {e.response.reason}] Did not have permission to get channel history.')
+            history = None
         except HTTPException as e:
-            log_to_database(guild, f'[{e.status} {e.response.reason}] Failed request to get channel history.')
-            return
+            await log_to_database(guild, f'[{e.status} {e.response.reason}] Failed request to get channel history.')
+            history = None
+
+        if history == []:
+            return 0
+
+        if history:
+            try:
+                return int(history[0].content)
+            except ValueError:
+                await log_to_database(guild, f'The previous message in #counting was not an integer.')
+
+        # Fall back to the last saved count
+        return await get_counting_count(guild)
+
+    @tasks.loop(minutes=1)
+    async def save_counts(self):
+        """Saves the counts that changed since they were last saved. Counts that fail to save are retried on the next run."""
+        unsaved_channels, self.unsaved_channels = self.unsaved_channels, {}
+        for channel_id, guild in unsaved_channels.items():
+            count = self.counts.get(channel_id)
+            if count is None:
+                continue
 
-        # Return if the previous message was not an integer (this should not happen)
-        try:
-            last_int = int(last_message_content)
-        except ValueError:
-            await delete_message(message)
-            log_to_database(guild, f'The previous message in #counting was not an integer.')
-            return
+            try:
+                saved = await update_database_guild(
+                    guild,
+                    {"$set": {"counting_count": count}},
+                    'Failed to save the current count.'
+                )
+            except PyMongoError as e:
+                print(f'Failed to save the current count: {e}')
+                saved = False
 
-        # Return if the message is not one more than the previous message
-        if message_int != last_int+1:
-            await delete_message(message)
-            return
-        
-        # Get the guild data from the database
-        guild_data = get_guild_data(guild)
-        if guild_data is None:
-            return
-        
-        # Get the current count
-        database_author = None
-        member_data = guild_data['member_data']
-        for member in member_data:
-            if member['member_id'] == message.author.id:
-                member['counted'] += 1
-                break
-        else:
-            # Add the member to the database
-            add_database_member(message.author)
-            return
+            if not saved:
+                self.unsaved_channels.setdefault(channel_id, guild)
 
-        # Update the database
-        update_database_guild(
-            guild,
-            {"$set": {"member_data": member_data}},
-            f'Failed to update count for member "{message.author.name}" (id={message.author.id}) to the database.'
-        )
+    @tasks.loop(seconds=10)
+    async def write_member_counts(self):
+        """Writes the buffered member counts to the database."""
+        await flush_member_counts()
 
     @commands.Cog.listener()
     async def on_raw_message_edit(self, payload):
         """Prevents editing."""
+        if not is_special_channel(payload.channel_id, 'counting') or not is_content_edit(payload):
+            return
+
         channel = self.bot.get_channel(payload.channel_id)
-        if channel.name != 'counting':
+        await self.forget_count(payload.channel_id, [payload.message_id])
+        await delete_message(get_edited_message(channel, payload))
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        """Forgets the count of a channel when the message that set it is deleted."""
+        await self.forget_count(payload.channel_id, [payload.message_id])
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload):
+        """Forgets the count of a channel when the message that set it is deleted in a bulk deletion."""
+        await self.forget_count(payload.channel_id, payload.message_ids)
+
+    async def forget_count(self, channel_id, message_ids):
+        """Drops the count of a channel if it was set by one of the messages, so that it is loaded from the channel history again."""
+        if self.last_message_ids.get(channel_id) not in message_ids:
             return
 
-        message = await get_message(channel, payload.message_id)
-        await delete_message(message)
+        async with self.count_locks[channel_id]:
+            if self.last_message_ids.get(channel_id) in message_ids:
+                self.counts.pop(channel_id, None)
+                self.last_message_ids.pop(channel_id, None)
 
     @staticmethod
     async def leaderboard(ctx, args):
-        """Shows the counting leaderboard."""
+        """Shows a page of the counting leaderboard."""
         guild = ctx.guild
-
-        # Get the guild data from the database
-        guild_data = get_guild_data(guild)
-        if guild_data is None:
-            return
-
-        # Get list of member scores
-        score_pairs = []
-        member_data = guild_data['member_data']
-        for member in member_data:
-            if discord.utils.get(guild.members, id=member['member_id']):
-                score_pairs.append({
-                    'member_id': member['member_id'],
-                    'counted': member['counted']
-                })
-        score_pairs.sort(key=lambda x: x['counted'], reverse=True)
-
-        # Get top ten
+        page_size = 10
+
+        # Get the page
+        page = 1
+        if args:
+            try:
+                page = int(args)
+            except ValueError:
+                await send_message(ctx.channel, f'Could not parse page "{args}".')
+                return
+        if page < 1:
+            page = 1
+
+        # Get the member scores, including counts that have not been written yet
+        await flush_member_counts()
+        score_pairs = await get_top_member_counts(guild, skip=(page-1)*page_size, limit=page_size)
+        author_score = await get_member_rank(ctx.author)
+        member_count = await count_database_members(guild)
+        page_count = max(1, math.ceil(member_count / page_size))
+
+        # Get the page of top counters
         top_ten = ''
         author_listed = False
-        for i, score_pair in enumerate(score_pairs):
-            
-            member = discord.utils.get(guild.members, id=score_pair['member_id'])
+        for i, score_pair in enumerate(score_pairs, start=(page-1)*page_size):
+
+            member = guild.get_member(score_pair['member_id'])
             if member == ctx.author:
                 author_listed = True
-            
-            if i < 10 or author_listed == False:
 
-                name = member.nick or member.name
-                score = score_pair['counted']
-                top_ten += f'{i+1}. {name}: {score}\n'
+            name = (member.nick or member.name) if member else 'Former member'
+            score = score_pair['counted']
+            top_ten += f'{i+1}. {name}: {score}\n'
 
-                continue
+        if not top_ten:
+            top_ten = 'There are no counters on this page.\n'
 
-            break
+        # Show the author's rank if they are not on this page
+        if author_score and author_listed == False:
+            score, rank = author_score
+            name = ctx.author.nick or ctx.author.name
+            top_ten += f'...\n{rank}. {name}: {score}\n'
 
         # Create embed
         embed = discord.Embed(title='Counting Leaderboard', color=ctx.bot.embed_color)
         embed.add_field(name='***Top Counters***', value=top_ten, inline=True)
+        embed.set_footer(text=f'Page {page}/{page_count}')
 
         # Send embed
         await send_message(ctx.channel, embed=embed)
@@ -155,32 +242,51 @@ class Counting(commands.Cog):
             await send_message(ctx.channel, 'You don\'t have permission to use that command.')
             return
 
-        # Get the guild data from the database
-        guild_data = get_guild_data(guild)
-        if guild_data is None:
-            return
-
         # Set the count to 0 for every member
-        member_data = guild_data['member_data']
-        for member in member_data:
-            member['counted'] = 0
-
-        # Update the database
-        updated = update_database_guild(
-            guild,
-            {"$set": {"member_data": member_data}},
-            'Failed to reset the count database.'
-        )
+        await flush_member_counts()
+        updated = await reset_member_counts(guild)
         if updated == False:
             return
         
         # Restart the counting channel
-        counting = discord.utils.get(guild.text_channels, name='counting')
+        counting = get_special_channel(guild, 'counting')
         if counting:
-            await send_message(counting, '1')
+            async with ctx.cog.count_locks[counting.id]:
+                message = await send_message(counting, '1')
+                ctx.cog.counts[counting.id] = 1
+                ctx.cog.last_message_ids[counting.id] = message.id if message else None
+                ctx.cog.unsaved_channels[counting.id] = guild
 
         await send_message(ctx.channel, 'Counting data has successfully been reset.')
 
+    @staticmethod
+    async def channel(ctx, args):
+        """Sets the counting channel."""
+        guild = ctx.guild
+
+        # Check if the caller has permission
+        if not ctx.author.guild_permissions.administrator:
+            await send_message(ctx.channel, 'You don\'t have permission to use that command.')
+            return
+
+        # Get the counting channel
+        channel = await convert_to_channel(ctx, args)
+        if channel is None:
+            await send_message(ctx.channel, f'Failed to parse "{args}" as a channel.')
+            return
+
+        # Update database
+        updated = await update_database_guild(
+            guild,
+            {"$set": {"counting_channel_id": channel.id}},
+            'Failed to change counting channel.'
+        )
+        if updated == False:
+            return
+        route_guild(guild, await get_special_channel_ids(guild))
+
+        await send_message(ctx.channel, f'Counting channel successfully changed to {channel.mention}.')
+
     @staticmethod
     async def help(ctx, args):
         """Help Command."""
@@ -188,7 +294,7 @@ class Counting(commands.Cog):
         embed = discord.Embed(title='Counting Help', color=ctx.bot.embed_color)
 
         description = '''
-        This Cog manages a channel with the name [#counting].
+        This Cog manages a channel with the name [#counting], or the channel set with the channel command.
 
         All messages that are not one number higher than the previous message will be deleted.
         The number of times a member sends a 'correct' message to the channel is tracked and ranked.
@@ -201,14 +307,18 @@ class Counting(commands.Cog):
         Show this message.
         Required Permission: Everyone
 
-        `{prefix}counting leaderboard`
-        `{prefix}counting lb`
-        Displays the current ranking for the counting channel
+        `{prefix}counting leaderboard [page]`
+        `{prefix}counting lb [page]`
+        Displays a page of the current ranking for the counting channel. Omit [page] to show the first page.
         Required Permission: Everyone
 
         `{prefix}counting reset`
         Resets the counting leaderboard. There is no way to recover this data.
         Required Permission: Administrator
+
+        `{prefix}counting channel [text channel]`
+        Sets [text channel] as the counting channel.
+        Required Permission: Administrator
         '''
         embed.add_field(name='***Commands***', value=command_list, inline=False)
 
@@ -1,7 +1,7 @@
 import discord
 
 from discord.ext import commands
-from utils.database import get_guild_data, log_to_database, update_database_guild
+from utils.database import LOG_TIMESTAMP_FORMAT, get_guild_logs, log_to_database, reset_guild_logs
 from utils.message import send_message
 
 
@@ -31,7 +31,7 @@ class Logs(commands.Cog):
             await send_message(ctx.channel, 'You don\'t have permission to use that command.')
             return
 
-        log_to_database(ctx.guild, f'[User Generated] {args}')
+        await log_to_database(ctx.guild, f'[User Generated] {args}')
 
     @staticmethod
     async def show(ctx, args):
@@ -43,38 +43,26 @@ class Logs(commands.Cog):
             await send_message(ctx.channel, 'You don\'t have permission to use that command.')
             return
 
-        # Get guild data
-        guild_data = get_guild_data(guild)
-        if guild_data is None:
-            return
-
-        # Check if the user wants to limit the number of logs
-        limit = None
+        # Check if the user wants to change the number of logs
+        limit = 20
         if args:
             try:
                 limit = int(args)
             except ValueError:
+                limit = 0
+            if limit < 1:
                 await send_message(ctx.channel, f'Could not parse limit "{args}".')
                 return
 
         # Get the logs list
-        guild_data['logs'].reverse()
-        if limit:
-            logs = guild_data['logs'][:limit]
-        else:
-            logs = guild_data['logs']
-        logs.reverse()
+        logs = await get_guild_logs(guild, limit)
 
         # Create log output
-        output = '```Server Logs'
-        if limit:
-            output += f' (last {limit})'
-        else:
-            output += f' (full history)'
+        output = f'```Server Logs (last {limit})'
         output += '\n\n'
 
         for log in logs:
-            output += f'{log}\n'
+            output += f'[{log["timestamp"].strftime(LOG_TIMESTAMP_FORMAT)}] {log["text"]}\n'
         output += '```'
             
         # Send logs
@@ -90,11 +78,7 @@ class Logs(commands.Cog):
             await send_message(ctx.channel, 'You don\'t have permission to use that command.')
             return
 
-        updated = update_database_guild(
-            guild,
-            {"$set": {"logs": []}},
-            'Failed to reset guild logs.'
-        )
+        updated = await reset_guild_logs(guild)
         if updated:
             await send_message(ctx.channel, 'Server logs have successfully been reset.') 
 
@@ -123,7 +107,8 @@ class Logs(commands.Cog):
         Required Permission: Manage Messages
 
         `{prefix}logs show [limit]`
-        Shows the past [limit] logs. Omit [limit] to show all logs.
+        Shows the past [limit] logs. Omit [limit] to show the past 20 logs.
+        Old logs are deleted automatically.
         Required Permission: Manage Messages
 
         `{prefix}logs reset`
@@ -2,7 +2,7 @@ import discord
 
 from discord.ext import commands
 from utils.channel import convert_to_channel
-from utils.database import get_guild_data, update_database_guild
+from utils.database import get_leave_channel_id, update_database_guild
 from utils.message import send_message
 
 
@@ -27,13 +27,13 @@ class MemberLeave(commands.Cog):
         """Sends a message when a member leaves the guild."""
         guild = member.guild
 
-        # Get guild data
-        guild_data = get_guild_data(guild)
-        if guild_data is None:
+        # Get leave channel
+        leave_channel_id = await get_leave_channel_id(guild)
+        if leave_channel_id is None:
             return
 
         # Send leave message
-        leave_channel = discord.utils.get(guild.text_channels, id=guild_data['leave_channel_id'])
+        leave_channel = discord.utils.get(guild.text_channels, id=leave_channel_id)
         await send_message(leave_channel, f'{member.mention} has left the server.')
 
     @staticmethod
@@ -45,11 +45,6 @@ class MemberLeave(commands.Cog):
         if not ctx.author.guild_permissions.administrator:
             await send_message(ctx.channel, 'You don\'t have permission to use that command.')
             return
-        
-        # Get guild data
-        guild_data = get_guild_data(guild)
-        if guild_data is None:
-            return
 
         # Get the leave channel
         leave_channel = await convert_to_channel(ctx, args)
@@ -58,7 +53,7 @@ class MemberLeave(commands.Cog):
             return
 
         # update the database
-        updated = update_database_guild(
+        updated = await update_database_guild(
             guild, 
             {"$set": {"leave_channel_id": leave_channel.id}},
             'Failed to change leave channel.'
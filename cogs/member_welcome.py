@@ -1,10 +1,17 @@
+import asyncio
 import discord
+import os
 
 from discord.ext import commands
 from utils.channel import convert_to_channel
-from utils.database import get_guild_data, update_database_guild
+from utils.database import add_database_members, get_welcome_settings, update_database_guild
 from utils.message import send_message
-from utils.role import convert_to_role, give_member_role
+from utils.metrics import add_stats
+from utils.role import convert_to_role, queue_member_role
+
+
+# Longest message Discord accepts
+MESSAGE_MAX_LENGTH = 2000
 
 
 class MemberWelcome(commands.Cog):
@@ -18,6 +25,17 @@ class MemberWelcome(commands.Cog):
             'help': self.help
         }
 
+        # Members who joined within the last WELCOME_BATCH_DELAY seconds (default 2) and have not been welcomed yet, by guild id
+        self.pending_joins = {}
+        self.batch_delay = float(os.environ.get('WELCOME_BATCH_DELAY', 2))
+        self.stats = {
+            'joins': 0,          # Members who joined
+            'batches': 0,        # Batches of members welcomed together
+            'messages': 0,       # Welcome messages sent
+            'max_batch_size': 0
+        }
+        add_stats('welcome', self.stats)
+
     @commands.command(aliases=['welcome'])
     async def member_welcome(self, ctx, subcommand=None, *, args=None):
         """Manages subcommands."""
@@ -27,26 +45,54 @@ class MemberWelcome(commands.Cog):
 
     @commands.Cog.listener()
     async def on_member_join(self, member):
-        """Sends a message when a member joins the guild."""
+        """Queues a member to be welcomed with the other members who join the guild within WELCOME_BATCH_DELAY seconds."""
         guild = member.guild
+        self.stats['joins'] += 1
+
+        pending = self.pending_joins.get(guild.id)
+        if pending is None:
+            pending = self.pending_joins[guild.id] = []
+            asyncio.ensure_future(self.welcome_later(guild))
+        pending.append(member)
+
+    async def flush(self):
+        """Welcomes every queued member without waiting for the end of their batch."""
+        await asyncio.gather(*(self.welcome_members(members[0].guild) for members in list(self.pending_joins.values())))
+
+    async def welcome_later(self, guild):
+        """Welcomes the queued members of a guild once the batch window has passed."""
+        await asyncio.sleep(self.batch_delay)
+        await self.welcome_members(guild)
+
+    async def welcome_members(self, guild):
+        """Adds the queued members of a guild to the database, sends one welcome message for all of them and queues their welcome role."""
+        members = self.pending_joins.pop(guild.id, None)
+        if not members:
+            return
+        self.stats['batches'] += 1
+        self.stats['max_batch_size'] = max(self.stats['max_batch_size'], len(members))
+
+        # Add the members to the database
+        await add_database_members(guild, members)
 
-        # Get guild data
-        guild_data = get_guild_data(guild)
-        if guild_data is None:
+        # Get welcome settings
+        welcome_settings = await get_welcome_settings(guild)
+        if welcome_settings is None:
             return
+        welcome_channel_id, welcome_message, welcome_role_id = welcome_settings
 
-        # Get welcome channel
-        welcome_channel = discord.utils.get(guild.channels, id=guild_data['welcome_channel_id'])
+        # Send welcome messages, mentioning as many members in each as fits
+        welcome_channel = guild.get_channel(welcome_channel_id)
         if welcome_channel:
+            for content in get_welcome_messages(guild, members, welcome_message):
+                await send_message(welcome_channel, content)
+                self.stats['messages'] += 1
 
-            # Send welcome message
-            welcome_message = f'Welcome {member.mention} to **{guild.name}**! {guild_data["welcome_message"]}'
-            await send_message(welcome_channel, welcome_message)
-
-        # Give welcome role
-        welcome_role = discord.utils.get(guild.roles, id=guild_data['welcome_role_id'])
-        if welcome_role:
-            await give_member_role(member, welcome_role)
+        # Give welcome role through the role queue, which edits members one at a time per guild
+        welcome_role = guild.get_role(welcome_role_id)
+        if welcome_role and not welcome_role.is_default():
+            for member in members:
+                queue_member_role(member, welcome_role, True)
 
     @staticmethod
     async def channel(ctx, args):
@@ -65,7 +111,7 @@ class MemberWelcome(commands.Cog):
             return
 
         # Update database
-        updated = update_database_guild(
+        updated = await update_database_guild(
             guild, 
             {"$set": {"welcome_channel": welcome_channel}},
             'Failed to change welcome channel.'
@@ -90,7 +136,7 @@ class MemberWelcome(commands.Cog):
             return
 
         # Update database
-        updated = update_database_guild(
+        updated = await update_database_guild(
             guild, 
             {"$set": {"welcome_role": welcome_role}},
             'Failed to change welcome role.'
@@ -112,7 +158,7 @@ class MemberWelcome(commands.Cog):
         welcome_message = args if args else ''
 
         # Update database
-        updated = update_database_guild(
+        updated = await update_database_guild(
             guild, 
             {"$set": {"welcome_message": welcome_message}},
             'Failed to change welcome message.'
@@ -128,6 +174,8 @@ class MemberWelcome(commands.Cog):
 
         description = '''
         This Cog manages members joining the server.
+
+        Members who join within a few seconds of each other are welcomed together in one message.
         '''
         embed.add_field(name='***Description***', value=description, inline=True)
 
@@ -155,5 +203,24 @@ class MemberWelcome(commands.Cog):
         await send_message(ctx.channel, embed=embed)
 
 
+def get_welcome_messages(guild, members, welcome_message) -> list[str]:
+    """Returns the welcome messages for members, split so that each message fits in a Discord message."""
+    suffix = f' to **{guild.name}**! {welcome_message}'
+    messages = []
+    mentions = []
+    length = len('Welcome') + len(suffix)
+    for member in members:
+        if mentions and length + len(member.mention) + 1 > MESSAGE_MAX_LENGTH:
+            messages.append(f'Welcome {" ".join(mentions)}{suffix}')
+            mentions = []
+            length = len('Welcome') + len(suffix)
+
+        mentions.append(member.mention)
+        length += len(member.mention) + 1
+
+    messages.append(f'Welcome {" ".join(mentions)}{suffix}')
+    return messages
+
+
 def setup(client):
     client.add_cog(MemberWelcome(client))
\ No newline at end of file
@@ -1,10 +1,17 @@
+import asyncio
 import discord
+import os
 
 from discord.ext import commands
-from utils.channel import create_voice_channel, delete_channel
+from utils.channel import create_voice_channel, delete_channel, edit_channel, move_member
+from utils.database import add_database_private_vc, claim_database_private_vc, delete_database_private_vc, get_all_private_vcs
 from utils.message import send_message
 
 
+CREATE_CHANNEL_NAME = 'Create Private VC'
+UNCLAIMED_NAME = '(unclaimed)'
+
+
 class PrivateVC(commands.Cog):
 
     def __init__(self, bot):
@@ -13,6 +20,14 @@ class PrivateVC(commands.Cog):
             'help': self.help
         }
 
+        # Private VC documents by private channel id, including unclaimed ones
+        self.private_vcs = {}
+
+        # Private channel ids of hidden private VCs that are ready to be claimed, by (guild id, category id)
+        self.pools = {}
+        self.pool_size = int(os.environ.get('PRIVATE_VC_POOL_SIZE', 1))
+        self.filling_pools = set()
+
     @commands.command(aliases=['pvc'])
     async def private_vc(self, ctx, subcommand=None, *, args=None):
         """Manages subcommands."""
@@ -20,58 +35,188 @@ class PrivateVC(commands.Cog):
         if subcommand in self.subcommands:
             await self.subcommands[subcommand](ctx, args)
 
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """Loads the private VCs, deleting those whose owner left while the bot was offline, and fills the pools."""
+        for private_vc in await get_all_private_vcs():
+            if private_vc['private_channel_id'] in self.private_vcs:
+                continue
+
+            guild = self.bot.get_guild(private_vc['guild_id'])
+            if guild is None:
+                continue
+
+            private_channel = guild.get_channel(private_vc['private_channel_id'])
+            waiting_channel = guild.get_channel(private_vc['waiting_channel_id'])
+
+            # Put unclaimed private VCs back in their pool
+            if private_vc['owner_id'] is None:
+                if private_channel and waiting_channel:
+                    self.private_vcs[private_channel.id] = private_vc
+                    self.get_pool(guild, private_channel.category).append(private_channel.id)
+                    continue
+
+            # Keep private VCs that still have their owner in them
+            elif private_channel and any(member.id == private_vc['owner_id'] for member in private_channel.members):
+                self.private_vcs[private_channel.id] = private_vc
+                continue
+
+            await self.delete_private_vc(guild, private_vc)
+
+        for guild in self.bot.guilds:
+            for channel in guild.voice_channels:
+                if channel.name == CREATE_CHANNEL_NAME:
+                    asyncio.ensure_future(self.fill_pool(guild, channel.category))
+
     @commands.Cog.listener()
     async def on_voice_state_update(self, member, before, after):
         """Creates and deletes private Voice Channels."""
         guild = member.guild
 
-        # Get potential private vc names
-        private_vc_name = f'Private - {member.nick or member.name}'
-        waiting_vc_name = f'Waiting - {member.nick or member.name}'
+        # Return if the member did not change channels
+        if before.channel == after.channel:
+            return
 
         # Delete private channels if the owner leaves
-        if before.channel and before.channel.name == private_vc_name:
-            
-            private_vc = discord.utils.get(guild.channels, name=private_vc_name)
-            waiting_vc = discord.utils.get(guild.channels, name=waiting_vc_name)
-            if private_vc:
-                await delete_channel(private_vc)
-            if waiting_vc:
-                await delete_channel(waiting_vc)
+        if before.channel:
+            private_vc = self.private_vcs.get(before.channel.id)
+            if private_vc and private_vc['owner_id'] == member.id:
+                await self.delete_private_vc(guild, private_vc)
 
         # Create private channels
-        if after.channel and after.channel.name == 'Create Private VC':
-            
-            # Create private channel overwrites
-            default_overwrite = discord.PermissionOverwrite(view_channel=False)
-            member_overwrite = discord.PermissionOverwrite(
-                view_channel=True,
-                move_members=True
-            )
-
-            # Create private voice channel
-            private_vc = await create_voice_channel(
-                guild=member.guild,
-                name=private_vc_name,
-                category=after.channel.category,
-                overwrites={member: member_overwrite, guild.default_role: default_overwrite}
-            )
+        if after.channel and after.channel.name == CREATE_CHANNEL_NAME:
+            await self.create_private_vc(member, after.channel.category)
+
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        """Deletes the rest of a private VC if its private channel is deleted by someone else."""
+        private_vc = self.private_vcs.get(channel.id)
+        if private_vc:
+            await self.delete_private_vc(channel.guild, private_vc)
+
+    def get_pool(self, guild, category) -> list:
+        """Returns the private channel ids of the unclaimed private VCs of a category."""
+        return self.pools.setdefault((guild.id, category.id if category else None), [])
+
+    async def create_private_vc(self, member, category):
+        """Gives a member a private VC, claiming one from the pool if there is one, and moves them into it."""
+        guild = member.guild
+        pool = self.get_pool(guild, category)
+
+        private_vc = None
+        while pool and private_vc is None:
+            private_vc = await self.claim_private_vc(member, self.private_vcs[pool.pop()])
+
+        # Create the channels if the pool was empty
+        if private_vc is None:
+            private_vc = await self.create_channels(guild, category, member)
             if private_vc is None:
                 return
-            
-            # Create waiting voice channel
-            waiting_vc = await create_voice_channel(
-                guild=member.guild,
-                name=waiting_vc_name,
-                category=after.channel.category,
-                overwrites={member: member_overwrite}
-            )
-            if waiting_vc is None:
-                await delete_channel(private_vc)
-                return
 
-            # Move member to their private vc
-            await member.move_to(private_vc)
+            await move_member(member, guild.get_channel(private_vc['private_channel_id']))
+
+        # Replace the claimed private VC in the background
+        asyncio.ensure_future(self.fill_pool(guild, category))
+
+    async def claim_private_vc(self, member, private_vc):
+        """
+        Gives an unclaimed private VC to a member and moves them into it.
+
+        Returns the private VC document or None if its channels are gone.
+        """
+        guild = member.guild
+        private_channel = guild.get_channel(private_vc['private_channel_id'])
+        waiting_channel = guild.get_channel(private_vc['waiting_channel_id'])
+        if private_channel is None or waiting_channel is None:
+            await self.delete_private_vc(guild, private_vc)
+            return None
+
+        private_vc['owner_id'] = member.id
+        member_overwrite = get_member_overwrite()
+
+        async def open_private_channel():
+            # The member is only moved once they can see the private channel
+            if await edit_channel(
+                private_channel,
+                name=f'Private - {member.nick or member.name}',
+                overwrites={member: member_overwrite, guild.default_role: get_default_overwrite()}
+            ):
+                await move_member(member, private_channel)
+
+        # The channels are separate rate limit buckets, so they are edited at the same time
+        await asyncio.gather(
+            open_private_channel(),
+            edit_channel(waiting_channel, name=f'Waiting - {member.nick or member.name}', overwrites={member: member_overwrite}),
+            claim_database_private_vc(member, private_channel.id)
+        )
+        return private_vc
+
+    async def create_channels(self, guild, category, member=None):
+        """
+        Creates the channels of a private VC for a member, or hidden unclaimed channels if member is None.
+
+        Returns the private VC document or None.
+        """
+        name = member.nick or member.name if member else UNCLAIMED_NAME
+        default_overwrite = get_default_overwrite()
+        if member:
+            member_overwrite = get_member_overwrite()
+            private_overwrites = {member: member_overwrite, guild.default_role: default_overwrite}
+            waiting_overwrites = {member: member_overwrite}
+        else:
+            private_overwrites = {guild.default_role: default_overwrite}
+            waiting_overwrites = {guild.default_role: default_overwrite}
+
+        # Create both channels at the same time
+        private_channel, waiting_channel = await asyncio.gather(
+            create_voice_channel(guild=guild, name=f'Private - {name}', category=category, overwrites=private_overwrites),
+            create_voice_channel(guild=guild, name=f'Waiting - {name}', category=category, overwrites=waiting_overwrites)
+        )
+        if private_channel is None or waiting_channel is None:
+            await asyncio.gather(*(delete_channel(channel) for channel in (private_channel, waiting_channel) if channel))
+            return None
+
+        # Record the owner
+        private_vc = await add_database_private_vc(guild, member.id if member else None, private_channel, waiting_channel)
+        if private_vc is None:
+            await asyncio.gather(delete_channel(private_channel), delete_channel(waiting_channel))
+            return None
+
+        self.private_vcs[private_channel.id] = private_vc
+        return private_vc
+
+    async def fill_pool(self, guild, category):
+        """Creates unclaimed private VCs until the pool of a category is full."""
+        key = (guild.id, category.id if category else None)
+        if key in self.filling_pools:
+            return
+
+        self.filling_pools.add(key)
+        try:
+            pool = self.get_pool(guild, category)
+            while len(pool) < self.pool_size:
+                private_vc = await self.create_channels(guild, category)
+                if private_vc is None:
+                    return
+                pool.append(private_vc['private_channel_id'])
+        finally:
+            self.filling_pools.discard(key)
+
+    async def delete_private_vc(self, guild, private_vc):
+        """Deletes the channels of a private VC and its database document."""
+        self.private_vcs.pop(private_vc['private_channel_id'], None)
+        for pool in self.pools.values():
+            if private_vc['private_channel_id'] in pool:
+                pool.remove(private_vc['private_channel_id'])
+
+        private_channel = guild.get_channel(private_vc['private_channel_id'])
+        waiting_channel = guild.get_channel(private_vc['waiting_channel_id'])
+        if private_channel:
+            await delete_channel(private_channel)
+        if waiting_channel:
+            await delete_channel(waiting_channel)
+
+        await delete_database_private_vc(guild, private_vc['private_channel_id'])
 
     @staticmethod
     async def help(ctx, args):
@@ -81,12 +226,14 @@ class PrivateVC(commands.Cog):
         description = '''
         This Cog manages private voice chat channels.
 
-        When a member joins a voice channel with the name 'Create Private VC', two new voice channels are created.
+        When a member joins a voice channel with the name 'Create Private VC', they are given two new voice channels.
         The first is titled 'Private - [creator name]' and can only be seen by those in it.
         The second is titled 'Waiting - [creator name]' and can be seen by any member.
 
         The creator of the voice channel can drag anyone from the 'Waiting' channel into the 'Private' channel.
         When the creator leaves the 'Private' channel, both are automatically deleted.
+
+        A few hidden channels are kept ready in the background so members are moved without waiting for them to be created.
         '''
         embed.add_field(name='***Description***', value=description, inline=True)
 
@@ -101,5 +248,15 @@ class PrivateVC(commands.Cog):
         await send_message(ctx.channel, embed=embed)
 
 
+def get_default_overwrite() -> discord.PermissionOverwrite:
+    """Returns the overwrite that hides a private channel from everyone."""
+    return discord.PermissionOverwrite(view_channel=False)
+
+
+def get_member_overwrite() -> discord.PermissionOverwrite:
+    """Returns the overwrite that gives the owner of a private VC access to it."""
+    return discord.PermissionOverwrite(view_channel=True, move_members=True)
+
+
 def setup(bot):
     bot.add_cog(PrivateVC(bot))
@@ -4,9 +4,9 @@ import discord
 from discord.ext import commands
 from discord.errors import Forbidden, HTTPException, InvalidArgument, NotFound
 from utils.channel import convert_to_channel
-from utils.database import get_guild_data, log_to_database, update_database_guild
+from utils.database import get_all_reaction_roles, log_to_database, update_database_guild
 from utils.message import delete_message, send_message
-from utils.role import convert_to_role, give_member_role, remove_member_role
+from utils.role import convert_to_role, queue_member_role
 
 
 class ReactionRole(commands.Cog):
@@ -18,6 +18,19 @@ class ReactionRole(commands.Cog):
             'help': ReactionRole.help,
         }
 
+        # Role ids by emoji, by (guild id, message id) for every Reaction Role
+        self.reaction_roles = {}
+
+    def add_reaction_role(self, guild_id, reaction_role):
+        """Adds a Reaction Role from the database to the lookup table."""
+        self.reaction_roles[(guild_id, reaction_role['message_id'])] = {
+            pair['emoji']: pair['role_id'] for pair in reaction_role['role-emoji_pairs']
+        }
+
+    def get_reaction_role(self, payload):
+        """Returns the role id for a reaction payload or None if the reaction is not part of a Reaction Role."""
+        return self.reaction_roles.get((payload.guild_id, payload.message_id), {}).get(str(payload.emoji))
+
     @commands.command(aliases=['rr'])
     async def reaction_role(self, ctx, subcommand=None, *, args=None):
         """Manages subcommands."""
@@ -25,13 +38,21 @@ class ReactionRole(commands.Cog):
         if subcommand in self.subcommands:
             await self.subcommands[subcommand](ctx, args)
 
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """Loads every Reaction Role into the lookup table."""
+        for guild_data in await get_all_reaction_roles():
+            for reaction_role in guild_data['reaction_roles']:
+                self.add_reaction_role(guild_data['guild_id'], reaction_role)
+
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload):
         """Gives a role from a Reaction Role message."""
         await edit_member_role(
             guild=self.bot.get_guild(payload.guild_id), 
             payload=payload, 
-            func=give_member_role
+            role_id=self.get_reaction_role(payload),
+            add=True
         )
 
     @commands.Cog.listener()
@@ -40,33 +61,37 @@ class ReactionRole(commands.Cog):
         await edit_member_role(
             guild=self.bot.get_guild(payload.guild_id), 
             payload=payload, 
-            func=remove_member_role
+            role_id=self.get_reaction_role(payload),
+            add=False
         )
 
     @commands.Cog.listener()
     async def on_raw_message_delete(self, payload):
         """Deletes a Reaction Role from the database."""
-        guild = self.bot.get_guild(payload.guild_id)
+        await self.delete_reaction_roles(payload.guild_id, [payload.message_id])
 
-        # Get guild data
-        guild_data = get_guild_data(guild)
-        if guild_data is None:
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload):
+        """Deletes every Reaction Role in a bulk deletion from the database."""
+        await self.delete_reaction_roles(payload.guild_id, payload.message_ids)
+
+    async def delete_reaction_roles(self, guild_id, message_ids):
+        """Deletes the Reaction Roles of any of the deleted messages from the database."""
+        # Return if none of the messages are Reaction Roles, which is the case for almost every deletion
+        message_ids = [message_id for message_id in message_ids if (guild_id, message_id) in self.reaction_roles]
+        if not message_ids:
             return
 
-        # Edit the guild data document
-        reaction_roles = guild_data['reaction_roles']
-        for rr in reaction_roles:
-            if rr['message_id'] == payload.message_id:
-                
-                reaction_roles.remove(rr)
-                break
-        else:
+        guild = self.bot.get_guild(guild_id)
+        if guild is None:
             return
 
         # Update the database
-        update_database_guild(
+        for message_id in message_ids:
+            self.reaction_roles.pop((guild_id, message_id), None)
+        await update_database_guild(
             guild,
-            {"$set": {"reaction_roles": reaction_roles}},
+            {"$pull": {"reaction_roles": {"message_id": {"$in": message_ids}}}},
             'Failed to remove a reaction role.'
         )
 
@@ -110,13 +135,13 @@ class ReactionRole(commands.Cog):
             try:
                 await message.add_reaction(emoji)
             except HTTPException as e:
-                log_to_database(guild, f'[{e.status} {e.response.reason}] Failed to add a reaction "{emoji}".')
+                await log_to_database(guild, f'[{e.status} {e.response.reason}] Failed to add a reaction "{emoji}".')
             except Forbidden as e:
-                log_to_database(guild, f'[{e.status} {e.response.reason}] Did not have permission to add a reaction.')  
+                await log_to_database(guild, f'[{e.status} {e.response.reason}] Did not have permission to add a reaction.')  
             except NotFound as e:
-                log_to_database(guild, f'[{e.status} {e.response.reason}] Failed to find emoji {emoji}.')
+                await log_to_database(guild, f'[{e.status} {e.response.reason}] Failed to find emoji {emoji}.')
             except InvalidArgument:
-                log_to_database(guild, f'Invalid emoji "{emoji}".')
+                await log_to_database(guild, f'Invalid emoji "{emoji}".')
             else:
                 continue
             
@@ -129,18 +154,20 @@ class ReactionRole(commands.Cog):
             return
         
         # Update the database
-        updated = update_database_guild(
+        reaction_role = {
+            "message_id": message.id,
+            "role-emoji_pairs": pairs
+        }
+        updated = await update_database_guild(
             guild,
-            {"$push": {"reaction_roles": { 
-                "message_id": message.id,
-                "role-emoji_pairs": pairs
-            }}},
+            {"$push": {"reaction_roles": reaction_role}},
             'Failed to add a Reaction Role to the database.'
         )
         if updated == False:
             await delete_message(message)
             await send_message(ctx.channel, 'An error occured adding the Reaction Role to the database. See logs for more detail.')
             return
+        ctx.cog.add_reaction_role(guild.id, reaction_role)
 
         # Send confirmation
         await send_message(ctx.channel, f'Reaction Role successfully created! Head to {channel.mention} to see it!')
@@ -180,35 +207,23 @@ def setup(bot):
     bot.add_cog(ReactionRole(bot))
 
 
-async def edit_member_role(guild, payload, func):
-    """Edits a member's roles from a Reaction Role message."""
-    # Get guild data
-    guild_data = get_guild_data(guild)
-    if guild_data is None:
+async def edit_member_role(guild, payload, role_id, add):
+    """Queues giving or removing a role from a Reaction Role message."""
+    # Return if the reaction is not part of a Reaction Role
+    if role_id is None or guild is None:
         return
 
     # Get the member
-    member = discord.utils.get(guild.members, id=payload.user_id)
+    member = guild.get_member(payload.user_id)
     if member is None or member.bot:
         return
 
-    for reaction_role in guild_data['reaction_roles']:
-        if reaction_role['message_id'] != payload.message_id:
-            continue
-        
-        for pair in reaction_role['role-emoji_pairs']:
-            if pair['emoji'] == str(payload.emoji):
-
-                role = discord.utils.get(guild.roles, id=pair['role_id'])
-                if role is None:
-                    continue
-                
-                await func(member, role)
-                break
-        else:
-            continue
+    # Get the role
+    role = guild.get_role(role_id)
+    if role is None:
+        return
 
-        break
+    queue_member_role(member, role, add)
 
 
 async def get_response(ctx, prompt):
@@ -0,0 +1,102 @@
+"""
+Moves the member_data arrays of guild documents into the 'members' collection.
+
+Safe to run while the bot is online and to run again after an interruption. The counts of each guild are added
+to the members collection in bulk batches, and every member document that received its legacy count is marked with
+legacy_migrated, so a count is never added twice. The member_data array is removed once every member of the guild
+is confirmed to be marked.
+
+Usage: python -m tools.migrate_members [--batch-size N]
+"""
+import argparse
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from utils.database import close_database, get_database
+
+
+# Error code of a write that would create a second document for the same guild and member
+DUPLICATE_KEY_ERROR = 11000
+
+
+def get_legacy_counts(member_data: list) -> dict:
+    """Returns the counts of a member_data array by member id, adding up members who were added more than once."""
+    counts = {}
+    for member in member_data:
+        counts[member['member_id']] = counts.get(member['member_id'], 0) + member.get('counted', 0)
+    return counts
+
+
+def migrate_guild(database, guild_id: int, member_data: list, batch_size: int) -> int:
+    """
+    Adds the legacy counts of a guild to the members collection, then removes its member_data array
+    if every member is marked with legacy_migrated.
+
+    Returns the number of members whose count was added by this run.
+    """
+    counts = list(get_legacy_counts(member_data).items())
+    migrated = 0
+    unmarked = 0
+    for start in range(0, len(counts), batch_size):
+        batch = counts[start:start + batch_size]
+        migrated += write_counts(database, guild_id, batch, upsert=True)
+        unmarked += len(batch) - database['members'].count_documents({
+            "guild_id": guild_id,
+            "member_id": {"$in": [member_id for member_id, _ in batch]},
+            "legacy_migrated": True
+        })
+
+    if unmarked:
+        print(f'Guild {guild_id}: kept member_data since {unmarked} members are not marked as migrated, run the migration again.')
+        return migrated
+
+    database['guilds'].update_one({"guild_id": guild_id}, {"$unset": {"member_data": ""}})
+    return migrated
+
+
+def write_counts(database, guild_id: int, counts: list, upsert: bool) -> int:
+    """
+    Adds (member id, count) pairs to the member documents of a guild that are not marked with legacy_migrated, and marks them.
+
+    An upsert fails with a duplicate key error when the member was already migrated, or when the bot created the member
+    document at the same time. The failed members are written again without upsert, which only adds the count in the second case.
+
+    Returns the number of members whose count was added.
+    """
+    requests = [
+        UpdateOne(
+            {"guild_id": guild_id, "member_id": member_id, "legacy_migrated": {"$ne": True}},
+            {"$inc": {"counted": counted}, "$set": {"legacy_migrated": True}},
+            upsert=upsert
+        )
+        for member_id, counted in counts
+    ]
+    try:
+        result = database['members'].bulk_write(requests, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details['writeErrors']
+        if not upsert or any(error['code'] != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        retried = write_counts(database, guild_id, [counts[error['index']] for error in errors], upsert=False)
+        return e.details['nModified'] + e.details['nUpserted'] + retried
+
+    return result.modified_count + result.upserted_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Moves guild member_data arrays into the members collection.')
+    parser.add_argument('--batch-size', type=int, default=1000, help='members written per bulk write')
+    args = parser.parse_args()
+
+    database = get_database()
+    try:
+        guilds = database['guilds'].find({"member_data": {"$exists": True}}, {"guild_id": True, "member_data": True})
+        for guild_data in guilds:
+            migrated = migrate_guild(database, guild_data['guild_id'], guild_data['member_data'], args.batch_size)
+            print(f'Guild {guild_data["guild_id"]}: migrated {migrated} of {len(guild_data["member_data"])} member records.')
+    finally:
+        close_database()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    A thread-safe mapping that evicts entries once they are older than ttl seconds,
+    and evicts the least recently used entry once it holds more than max_size entries.
+
+    Every pop, pop_where or clear bumps a generation. A caller that loads a value outside the cache
+    takes generation(key) before loading and passes it to set(), so that a value loaded before an eviction
+    is not stored afterwards.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generations = {}
+        self._clear_generation = 0
+
+    def generation(self, key) -> tuple:
+        """Returns the current generation of key."""
+        with self._lock:
+            return self._clear_generation, self._generations.get(key, 0)
+
+    def get(self, key, default=None):
+        """Returns the value for key, or default if it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, generation=None) -> bool:
+        """
+        Stores value for key, evicting the least recently used entry if the cache is full.
+
+        If generation is given and key was evicted since it was taken, value is not stored. Returns True if value was stored.
+        """
+        with self._lock:
+            if generation is not None and generation != (self._clear_generation, self._generations.get(key, 0)):
+                return False
+
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            return True
+
+    def pop(self, key, default=None):
+        """Removes key and returns its value, or default if it is missing."""
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            entry = self._entries.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def pop_where(self, predicate) -> None:
+        """Removes every entry whose value satisfies predicate. Values being loaded for any key are not stored afterwards."""
+        with self._lock:
+            self._clear_generation += 1
+            for key in [key for key, (_, value) in self._entries.items() if predicate(value)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        """Removes every entry."""
+        with self._lock:
+            self._clear_generation += 1
+            self._generations.clear()
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -3,23 +3,27 @@ from discord.ext.commands.errors import BadArgument, CommandError
 from discord.errors import Forbidden, HTTPException, InvalidArgument, NotFound
 from discord.channel import CategoryChannel, TextChannel, VoiceChannel
 from discord.guild import Guild
+from discord.member import Member
 from discord.permissions import PermissionOverwrite
 from typing import Union
 from utils.database import log_to_database
+from utils.metrics import instrument
 
 
+@instrument('discord')
 async def delete_channel(channel: Union[VoiceChannel, TextChannel]) -> None:
     """Wrapper for discord.py channel.delete()"""
     try:
         await channel.delete()
     except Forbidden as e:
-        log_to_database(channel.guild, f'[{e.status} {e.response.reason}] Did not have permission to delete a channel.')
+        await log_to_database(channel.guild, f'[{e.status} {e.response.reason}] Did not have permission to delete a channel.')
     except NotFound as e:
-        log_to_database(channel.guild, f'[{e.status} {e.response.reason}] A channel "{channel.name}" (id={channel.id}) could not be found.')
+        await log_to_database(channel.guild, f'[{e.status} {e.response.reason}] A channel "{channel.name}" (id={channel.id}) could not be found.')
     except HTTPException as e:
-        log_to_database(channel.guild, f'[{e.status} {e.response.reason}] Failed to delete a channel.')
+        await log_to_database(channel.guild, f'[{e.status} {e.response.reason}] Failed to delete a channel.')
 
 
+@instrument('discord')
 async def create_voice_channel(guild: Guild, name: str, category: CategoryChannel, overwrites: PermissionOverwrite) -> VoiceChannel:
     """
     Wrapper for discord.py channel.create_voice_channel() 
@@ -33,18 +37,62 @@ async def create_voice_channel(guild: Guild, name: str, category: CategoryChanne
             overwrites=overwrites
         )
     except Forbidden as e:
-        log_to_database(guild, f'[{e.status} {e.response.reason}] Did not have permission to create a channel.')
+        await log_to_database(guild, f'[{e.status} {e.response.reason}] Did not have permission to create a channel.')
         return None
     except HTTPException as e:
-        log_to_database(guild, f'[{e.status} {e.response.reason}] Failed to create a channel.')    
+        await log_to_database(guild, f'[{e.status} {e.response.reason}] Failed to create a channel.')    
         return None  
     except InvalidArgument:
-        log_to_database(guild, 'Failed to create a voice channel because overwrite information was not in proper form (Contact Developer).')   
+        await log_to_database(guild, 'Failed to create a voice channel because overwrite information was not in proper form (Contact Developer).')   
         return None
 
     return voice_channel
 
 
+@instrument('discord')
+async def edit_channel(channel: Union[VoiceChannel, TextChannel], **options) -> bool:
+    """
+    Wrapper for discord.py channel.edit()
+
+    Returns True if successful and False if unsuccessful.
+    """
+    try:
+        await channel.edit(**options)
+    except Forbidden as e:
+        await log_to_database(channel.guild, f'[{e.status} {e.response.reason}] Did not have permission to edit a channel.')
+        return False
+    except NotFound as e:
+        await log_to_database(channel.guild, f'[{e.status} {e.response.reason}] A channel "{channel.name}" (id={channel.id}) could not be found.')
+        return False
+    except HTTPException as e:
+        await log_to_database(channel.guild, f'[{e.status} {e.response.reason}] Failed to edit a channel.')
+        return False
+    except InvalidArgument:
+        await log_to_database(channel.guild, 'Failed to edit a channel because the options were not in proper form (Contact Developer).')
+        return False
+
+    return True
+
+
+@instrument('discord')
+async def move_member(member: Member, channel: VoiceChannel) -> bool:
+    """
+    Wrapper for discord.py member.move_to()
+
+    Returns True if successful and False if unsuccessful.
+    """
+    try:
+        await member.move_to(channel)
+    except Forbidden as e:
+        await log_to_database(member.guild, f'[{e.status} {e.response.reason}] Did not have permission to move a member.')
+        return False
+    except HTTPException as e:
+        await log_to_database(member.guild, f'[{e.status} {e.response.reason}] Failed to move a member.')
+        return False
+
+    return True
+
+
 async def convert_to_channel(ctx, arg) -> TextChannel:
     """
     Wrapper for discord.py commands.TextChannelConverter().convert()
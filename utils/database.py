@@ -1,44 +1,543 @@
 from logging import error
+import asyncio
 import os
 import datetime
+import functools
+import threading
 
 from dotenv import load_dotenv
-from pymongo import MongoClient
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import ASCENDING, DESCENDING, MongoClient, UpdateOne
 from pymongo.database import Database
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
+from discord.channel import VoiceChannel
 from discord.guild import Guild
 from discord.member import Member
+from utils.cache import TTLCache
+from utils.metrics import MongoCommandListener, add_stats, instrument
+
+
+# Format of log timestamps
+LOG_TIMESTAMP_FORMAT = "%d %b. %Y %H:%M:%S"
+
+# Process-wide MongoClient, created on the first call to get_database()
+_mongo_client = None
+_mongo_client_lock = threading.Lock()
+
+# Blocking pymongo calls run on this thread pool so they never stall the event loop
+_database_executor = None
+
+# Fields of guild documents by guild id, as a tuple of the set of field names fetched so far and the partial document.
+# Entries are evicted when they expire, when the guild is updated, or on a change stream event.
+# Cached documents are shared between callers and must not be modified in place.
+_guild_cache = None
+
+# Set to stop the change stream thread started by start_guild_cache_watcher()
+_guild_watcher_stop = threading.Event()
+
+# Fields of the guild document read by each feature
+WELCOME_FIELDS = ("welcome_channel_id", "welcome_message", "welcome_role_id")
+LEAVE_FIELDS = ("leave_channel_id",)
+BANNED_WORDS_FIELDS = ("banned_words", "banned_words_mode")
+SPECIAL_CHANNEL_FIELDS = ("counting_channel_id", "around_the_world_channel_id")
+COUNTING_COUNT_FIELDS = ("counting_count",)
+
+# Logs waiting to be written by the log writer task. When the queue is full, new logs are dropped.
+_log_queue = None
+_log_writer = None
+log_stats = {
+    'queued': 0,   # Logs added to the queue
+    'written': 0,  # Logs written to the database
+    'dropped': 0,  # Logs dropped because the queue was full
+    'batches': 0   # Bulk inserts
+}
+add_stats('logs', log_stats)
+
+# Counting increments that have not been written yet, by (guild id, member id)
+_pending_member_counts = {}
+_pending_member_counts_lock = threading.Lock()
+member_count_stats = {
+    'buffered': 0,  # Increments added to the buffer
+    'flushed': 0,   # Increments written to the database
+    'writes': 0,    # Member documents written to the database
+    'flushes': 0    # Bulk writes
+}
+add_stats('member_counts', member_count_stats)
+
+
+def get_mongo_client() -> MongoClient:
+    """
+    Returns the process-wide MongoClient, creating it on the first call.
+
+    The pool size and timeouts can be configured with the MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE,
+    MONGO_CONNECT_TIMEOUT_MS, MONGO_SERVER_SELECTION_TIMEOUT_MS and MONGO_SOCKET_TIMEOUT_MS environment variables.
+
+    The client is only kept once its indexes are created. If that fails, the error is raised and the next call tries again.
+    """
+    global _mongo_client
+    if _mongo_client is not None:
+        return _mongo_client
+
+    with _mongo_client_lock:
+        if _mongo_client is None:
+            load_dotenv()
+            mongo_client = MongoClient(
+                os.environ.get('MONGO_URI'),
+                maxPoolSize=int(os.environ.get('MONGO_MAX_POOL_SIZE', 50)),
+                minPoolSize=int(os.environ.get('MONGO_MIN_POOL_SIZE', 0)),
+                connectTimeoutMS=int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 10000)),
+                serverSelectionTimeoutMS=int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 10000)),
+                socketTimeoutMS=int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 20000)),
+                event_listeners=[MongoCommandListener()]
+            )
+            try:
+                _create_indexes(mongo_client['database'])
+            except Exception:
+                mongo_client.close()
+                raise
+            _mongo_client = mongo_client
+
+    return _mongo_client
+
+
+def _create_indexes(database: Database) -> None:
+    """
+    Creates the indexes used by the queries in this module if they don't exist yet.
+
+    Logs are deleted after LOG_TTL_DAYS (default 30) days.
+    """
+    database['members'].create_index([("guild_id", ASCENDING), ("member_id", ASCENDING)], unique=True)
+    database['members'].create_index([("guild_id", ASCENDING), ("counted", DESCENDING)])
+
+    database['private_vcs'].create_index("private_channel_id", unique=True)
+
+    database['logs'].create_index([("guild_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)])
+    log_ttl = int(float(os.environ.get('LOG_TTL_DAYS', 30)) * 24 * 60 * 60)
+    try:
+        database['logs'].create_index("timestamp", expireAfterSeconds=log_ttl)
+    except OperationFailure:
+        # The index exists with another TTL
+        database.command('collMod', 'logs', index={"keyPattern": {"timestamp": 1}, "expireAfterSeconds": log_ttl})
 
 
 def get_database() -> Database:
     """Returns the MongoDB database or None."""
-    load_dotenv()
-    mongo_client = MongoClient(os.environ.get('MONGO_URI'))
+    mongo_client = get_mongo_client()
     if mongo_client is None:
         return None
 
     return mongo_client['database']
 
 
-def get_guild_data(guild: Guild):
+def close_database() -> None:
+    """Stops the guild cache watcher, waits for pending database calls, then closes the process-wide MongoClient and its connection pool."""
+    global _mongo_client, _database_executor
+    _guild_watcher_stop.set()
+    with _mongo_client_lock:
+        if _database_executor is not None:
+            _database_executor.shutdown(wait=True)
+            _database_executor = None
+        if _mongo_client is not None:
+            _mongo_client.close()
+            _mongo_client = None
+
+
+def get_database_executor() -> ThreadPoolExecutor:
     """
-    Wrapper for MongoDB collection.find_one() in the 'guilds' collection.
-    
-    Returns the document or None.
-    """   
-    guild_data = get_database()['guilds'].find_one({"guild_id": guild.id})
+    Returns the thread pool used for database calls, creating it on the first call.
+
+    At most MONGO_MAX_WORKERS (default 8) database calls run at once, further calls wait in the pool's queue.
+    """
+    global _database_executor
+    if _database_executor is not None:
+        return _database_executor
+
+    with _mongo_client_lock:
+        if _database_executor is None:
+            load_dotenv()
+            _database_executor = ThreadPoolExecutor(
+                max_workers=int(os.environ.get('MONGO_MAX_WORKERS', 8)),
+                thread_name_prefix='database'
+            )
+
+    return _database_executor
+
+
+def get_guild_cache() -> TTLCache:
+    """
+    Returns the guild document cache, creating it on the first call.
+
+    Its size and entry lifetime (in seconds) can be configured with the GUILD_CACHE_SIZE and GUILD_CACHE_TTL environment variables.
+    """
+    global _guild_cache
+    if _guild_cache is not None:
+        return _guild_cache
+
+    with _mongo_client_lock:
+        if _guild_cache is None:
+            load_dotenv()
+            _guild_cache = TTLCache(
+                max_size=int(os.environ.get('GUILD_CACHE_SIZE', 1000)),
+                ttl=float(os.environ.get('GUILD_CACHE_TTL', 3600))
+            )
+
+    return _guild_cache
+
+
+def start_guild_cache_watcher() -> None:
+    """
+    Starts a background thread that evicts cached guild documents when a MongoDB change stream reports they changed,
+    so that several bot processes sharing the database stay coherent.
+
+    Does nothing unless the MONGO_CHANGE_STREAM environment variable is set. Change streams need a replica set.
+    """
+    load_dotenv()
+    if not os.environ.get('MONGO_CHANGE_STREAM'):
+        return
+
+    _guild_watcher_stop.clear()
+    thread = threading.Thread(target=_watch_guild_changes, name='guild-cache-watcher', daemon=True)
+    thread.start()
+
+
+def _watch_guild_changes() -> None:
+    """
+    Evicts cached guild documents for every change reported by the 'guilds' change stream.
+
+    When the stream fails, for example during a replica set election, it is reopened after a delay that doubles
+    up to a minute, and the cache is cleared since changes may have been missed in between.
+    """
+    guild_cache = get_guild_cache()
+    delay = 1
+    while not _guild_watcher_stop.is_set():
+        try:
+            with get_database()['guilds'].watch(full_document='updateLookup') as stream:
+                # Drop anything changed by other processes while the stream was down
+                guild_cache.clear()
+                delay = 1
+                for change in stream:
+                    guild_id = (change.get('fullDocument') or {}).get('guild_id')
+                    if guild_id is not None:
+                        guild_cache.pop(guild_id)
+                    else:
+                        # Deleted documents only have their _id
+                        document_id = change.get('documentKey', {}).get('_id')
+                        guild_cache.pop_where(lambda entry: entry[1]['_id'] == document_id)
+        except PyMongoError as e:
+            if _guild_watcher_stop.is_set():
+                break
+            print(f'Lost the guild change stream, reopening it in {delay} s: {e}')
+            guild_cache.clear()
+
+        _guild_watcher_stop.wait(delay)
+        delay = min(delay * 2, 60)
+
+
+async def run_in_database(func, *args, **kwargs):
+    """Runs a blocking database function on the database thread pool and returns its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_database_executor(), functools.partial(func, *args, **kwargs))
+
+
+@instrument('database')
+async def get_guild_fields(guild: Guild, *fields: str) -> dict:
+    """
+    Wrapper for MongoDB collection.find_one() in the 'guilds' collection, projected to fields.
+
+    Returns a document with the fields the guild has among fields, or None. Fields are served from the guild cache
+    when possible, and only the fields missing from the cache are fetched.
+    """
+    guild_cache = get_guild_cache()
+    generation = guild_cache.generation(guild.id)
+    cached_fields, cached_data = guild_cache.get(guild.id, (frozenset(), None))
+    missing = [field for field in fields if field not in cached_fields]
+    if not missing:
+        return cached_data
+
+    guild_data = await run_in_database(_get_guild_fields, guild, missing)
     if guild_data is None:
-        log_to_database(guild, f'Could not find guild data.')
         return None
-    
+
+    # Merge into a new document, since the cached one may be in use
+    if cached_data is not None:
+        guild_data = {**cached_data, **guild_data}
+
+    # Not stored if the guild was updated while it was fetched, since either part may be stale
+    guild_cache.set(guild.id, (cached_fields.union(missing), guild_data), generation)
+
     return guild_data
 
 
-def update_database_guild(guild: Guild, update, failure_message: str, upsert=False, bypass_document_validation=False, collation=None, array_filters=None, hint=None, session=None) -> bool:
+@instrument('database')
+async def get_welcome_settings(guild: Guild) -> tuple:
+    """Returns a tuple of the welcome channel id, welcome message and welcome role id of a guild, or None."""
+    guild_data = await get_guild_fields(guild, *WELCOME_FIELDS)
+    if guild_data is None:
+        return None
+
+    return guild_data.get('welcome_channel_id', 0), guild_data.get('welcome_message', ''), guild_data.get('welcome_role_id', 0)
+
+
+@instrument('database')
+async def get_leave_channel_id(guild: Guild) -> int:
+    """Returns the id of the leave channel of a guild, 0 if it has none, or None."""
+    guild_data = await get_guild_fields(guild, *LEAVE_FIELDS)
+    if guild_data is None:
+        return None
+
+    return guild_data.get('leave_channel_id', 0)
+
+
+@instrument('database')
+async def get_banned_words(guild: Guild) -> tuple:
+    """Returns a tuple of the banned words of a guild and their match mode, or None."""
+    guild_data = await get_guild_fields(guild, *BANNED_WORDS_FIELDS)
+    if guild_data is None:
+        return None
+
+    return guild_data.get('banned_words', []), guild_data.get('banned_words_mode', 'substring')
+
+
+@instrument('database')
+async def get_special_channel_ids(guild: Guild) -> dict:
+    """Returns a document with the '[kind]_channel_id' fields a guild has set, or None."""
+    return await get_guild_fields(guild, *SPECIAL_CHANNEL_FIELDS)
+
+
+@instrument('database')
+async def get_counting_count(guild: Guild) -> int:
+    """Returns the last saved count of a guild, or None if it has not been saved."""
+    guild_data = await get_guild_fields(guild, *COUNTING_COUNT_FIELDS)
+    if guild_data is None:
+        return None
+
+    return guild_data.get('counting_count')
+
+
+@instrument('database')
+async def update_database_guild(guild: Guild, update, failure_message: str, **kwargs) -> bool:
     """
     Wrapper for MongoDB collection.update_one() in the 'guilds' collection.
     
     Returns True if successful and False is unsuccessful.
     """
+    return await run_in_database(_update_database_guild, guild, update, failure_message, **kwargs)
+
+
+@instrument('database')
+async def log_to_database(guild: Guild, *args, sep=' ') -> None:
+    """
+    Logs text to the database.
+
+    The log is queued without waiting for the database, and written in a batch by a background task.
+    At most LOG_QUEUE_SIZE (default 1000) logs can wait at once, further logs are dropped until the queue drains.
+    """
+    global _log_queue, _log_writer
+    if _log_queue is None:
+        _log_queue = asyncio.Queue(maxsize=int(os.environ.get('LOG_QUEUE_SIZE', 1000)))
+    if _log_writer is None or _log_writer.done():
+        _log_writer = asyncio.ensure_future(_write_logs())
+
+    try:
+        _log_queue.put_nowait(_create_log(guild, args, sep))
+    except asyncio.QueueFull:
+        log_stats['dropped'] += 1
+        return
+
+    log_stats['queued'] += 1
+
+
+async def _write_logs() -> None:
+    """Writes queued logs to the database in batches of up to LOG_BATCH_SIZE (default 100) logs, forever."""
+    batch_size = int(os.environ.get('LOG_BATCH_SIZE', 100))
+    dropped = 0
+    while True:
+        # Wait for a log, then take every log that queued up behind it
+        logs = [await _log_queue.get()]
+        while len(logs) < batch_size and not _log_queue.empty():
+            logs.append(_log_queue.get_nowait())
+
+        if log_stats['dropped'] > dropped:
+            print(f'Dropped {log_stats["dropped"] - dropped} logs because the log queue was full.')
+            dropped = log_stats['dropped']
+
+        await run_in_database(_insert_logs, logs)
+
+
+@instrument('database')
+async def flush_logs() -> None:
+    """Stops the log writer task and writes every queued log to the database."""
+    global _log_writer
+    if _log_writer is not None:
+        _log_writer.cancel()
+        _log_writer = None
+
+    if _log_queue is None:
+        return
+
+    logs = []
+    while not _log_queue.empty():
+        logs.append(_log_queue.get_nowait())
+    if logs:
+        await run_in_database(_insert_logs, logs)
+
+
+@instrument('database')
+async def get_guild_logs(guild: Guild, limit: int) -> list:
+    """Returns the last limit logs of a guild, oldest first."""
+    return await run_in_database(_get_guild_logs, guild, limit)
+
+
+@instrument('database')
+async def reset_guild_logs(guild: Guild) -> bool:
+    """
+    Deletes every log of a guild.
+
+    Returns True if successful, and False if unsuccessful.
+    """
+    return await run_in_database(_reset_guild_logs, guild)
+
+
+@instrument('database')
+async def get_all_reaction_roles() -> list:
+    """Returns the guild id and Reaction Roles of every guild."""
+    return await run_in_database(_get_all_reaction_roles)
+
+
+@instrument('database')
+async def get_all_private_vcs() -> list:
+    """Returns every private VC."""
+    return await run_in_database(_get_all_private_vcs)
+
+
+@instrument('database')
+async def add_database_private_vc(guild: Guild, owner_id: int, private_channel: VoiceChannel, waiting_channel: VoiceChannel) -> dict:
+    """
+    Adds a private VC to the database. owner_id is None for private VCs that have not been claimed yet.
+
+    Returns the private VC document or None.
+    """
+    return await run_in_database(_add_database_private_vc, guild, owner_id, private_channel, waiting_channel)
+
+
+@instrument('database')
+async def claim_database_private_vc(owner: Member, private_channel_id: int) -> bool:
+    """
+    Sets the owner of an unclaimed private VC.
+
+    Returns True if successful, and False if unsuccessful.
+    """
+    return await run_in_database(_claim_database_private_vc, owner, private_channel_id)
+
+
+@instrument('database')
+async def delete_database_private_vc(guild: Guild, private_channel_id: int) -> bool:
+    """
+    Deletes a private VC from the database.
+
+    Returns True if successful, and False if unsuccessful.
+    """
+    return await run_in_database(_delete_database_private_vc, guild, private_channel_id)
+
+
+@instrument('database')
+async def add_database_member(member: Member) -> bool:
+    """
+    Adds a member to the database. 
+    
+    Returns True if successful, and False if unsuccessful.
+    """
+    return await run_in_database(_add_database_member, member)
+
+
+@instrument('database')
+async def add_database_members(guild: Guild, members: list[Member]) -> bool:
+    """
+    Adds several members of a guild to the 'members' collection with a single bulk write.
+
+    Returns True if successful, and False if unsuccessful.
+    """
+    return await run_in_database(_add_database_members, guild, members)
+
+
+def buffer_member_count(member: Member, amount=1) -> int:
+    """
+    Adds amount to the number of times a member has counted.
+
+    The increment is kept in memory and coalesced with the member's other increments until flush_member_counts() writes it.
+    Returns the number of members with pending increments.
+    """
+    key = (member.guild.id, member.id)
+    with _pending_member_counts_lock:
+        _pending_member_counts[key] = _pending_member_counts.get(key, 0) + amount
+        member_count_stats['buffered'] += amount
+        return len(_pending_member_counts)
+
+
+@instrument('database')
+async def flush_member_counts() -> bool:
+    """
+    Writes every pending counting increment to the database in one bulk write.
+
+    Returns True if successful, and False if unsuccessful. Increments that failed to be written are kept for the next flush.
+    """
+    return await run_in_database(_flush_member_counts)
+
+
+@instrument('database')
+async def get_top_member_counts(guild: Guild, skip=0, limit=10) -> list:
+    """Returns the counting stats of up to limit members of a guild, highest count first, after skipping skip members."""
+    return await run_in_database(_get_top_member_counts, guild, skip, limit)
+
+
+@instrument('database')
+async def get_member_rank(member: Member) -> tuple:
+    """
+    Returns a tuple of the number of times a member has counted and their rank in the guild's leaderboard,
+    or None if the member has never counted.
+    """
+    return await run_in_database(_get_member_rank, member)
+
+
+@instrument('database')
+async def count_database_members(guild: Guild) -> int:
+    """Returns the number of members of a guild with counting stats."""
+    return await run_in_database(_count_database_members, guild)
+
+
+@instrument('database')
+async def reset_member_counts(guild: Guild) -> bool:
+    """
+    Sets the number of times every member of a guild has counted to 0.
+
+    Returns True if successful, and False if unsuccessful.
+    """
+    return await run_in_database(_reset_member_counts, guild)
+
+
+@instrument('database')
+async def add_database_guild(guild: Guild) -> bool:
+    """
+    Adds a guild to the database. 
+    
+    Returns True if successful, and False if unsuccessful.
+    """
+    return await run_in_database(_add_database_guild, guild)
+
+
+def _get_guild_fields(guild: Guild, fields: list) -> dict:
+    """Blocking implementation of get_guild_fields()."""
+    # The _id is always returned, so the change stream watcher can find cached documents
+    guild_data = get_database()['guilds'].find_one({"guild_id": guild.id}, {field: True for field in fields})
+    if guild_data is None:
+        _log_to_database(guild, f'Could not find guild data.')
+        return None
+    
+    return guild_data
+
+
+def _update_database_guild(guild: Guild, update, failure_message: str, upsert=False, bypass_document_validation=False, collation=None, array_filters=None, hint=None, session=None) -> bool:
+    """Blocking implementation of update_database_guild()."""
     # Update the database
     update_result = get_database()['guilds'].update_one(
         filter={"guild_id": guild.id}, 
@@ -51,72 +550,251 @@ def update_database_guild(guild: Guild, update, failure_message: str, upsert=Fal
         session=session
     )
 
+    # The cached document is stale now, the next read fetches the updated one
+    get_guild_cache().pop(guild.id)
+
     # Check if the update succeeded
     if update_result.acknowledged == False:     
-        log_to_database(guild, failure_message)
+        _log_to_database(guild, failure_message)
+        return False
+
+    return True
+
+
+def _log_to_database(guild: Guild, *args, sep=' ') -> None:
+    """Logs text to the database immediately, for use by the blocking functions in this module."""
+    _insert_logs([_create_log(guild, args, sep)])
+
+
+def _create_log(guild: Guild, args: tuple, sep: str) -> dict:
+    """Returns a log document for the text."""
+    return {
+        "guild_id": guild.id,
+        "timestamp": datetime.datetime.utcnow(),
+        "text": sep.join(str(arg) for arg in args)
+    }
+
+
+def _insert_logs(logs: list) -> None:
+    """Prints logs and adds them to the database."""
+    for log in logs:
+        print(f'[{log["timestamp"].strftime(LOG_TIMESTAMP_FORMAT)}] {log["text"]}')
+
+    try:
+        insert_result = get_database()['logs'].insert_many(logs, ordered=False)
+    except PyMongoError as e:
+        print(f'Failed to push {len(logs)} logs to the database: {e}')
+        return
+
+    if insert_result.acknowledged == False:
+        print(f'Failed to push {len(logs)} logs to the database.')
+        return
+
+    log_stats['written'] += len(logs)
+    log_stats['batches'] += 1
+
+
+def _get_guild_logs(guild: Guild, limit: int) -> list:
+    """Blocking implementation of get_guild_logs()."""
+    logs = list(get_database()['logs'].find(
+        {"guild_id": guild.id},
+        {"_id": False, "timestamp": True, "text": True}
+    ).sort([("timestamp", DESCENDING), ("_id", DESCENDING)]).limit(limit))
+    logs.reverse()
+
+    return logs
+
+
+def _reset_guild_logs(guild: Guild) -> bool:
+    """Blocking implementation of reset_guild_logs()."""
+    delete_result = get_database()['logs'].delete_many({"guild_id": guild.id})
+
+    # Check if the delete succeeded
+    if delete_result.acknowledged == False:
+        _log_to_database(guild, 'Failed to reset guild logs.')
         return False
 
     return True
 
 
-def log_to_database(guild: Guild, *args, sep=' ') -> None:
-    """Logs text to the database."""
-    # Get the timestamp
-    timestamp = datetime.datetime.now().strftime("%d %b. %Y %H:%M:%S")
-
-    # Get the log text
-    log_text = ''
-    for i, arg in enumerate(args):
-        log_text += str(arg)
-        if i < len(args)-1:
-            log_text += sep
-    log_output = f'[{timestamp}] {log_text}'
-
-    # Add the log to the database
-    print(log_output)
-    update_database_guild(
-        guild,
-        {"$push": {"logs": log_output}},
-        'Failed to push a log to the database.'
+def _get_all_reaction_roles() -> list:
+    """Blocking implementation of get_all_reaction_roles()."""
+    return list(get_database()['guilds'].find(
+        {"reaction_roles.0": {"$exists": True}},
+        {"_id": False, "guild_id": True, "reaction_roles": True}
+    ))
+
+
+def _get_all_private_vcs() -> list:
+    """Blocking implementation of get_all_private_vcs()."""
+    return list(get_database()['private_vcs'].find({}, {"_id": False}))
+
+
+def _add_database_private_vc(guild: Guild, owner_id: int, private_channel: VoiceChannel, waiting_channel: VoiceChannel) -> dict:
+    """Blocking implementation of add_database_private_vc()."""
+    private_vc = {
+        "guild_id": guild.id,
+        "owner_id": owner_id,
+        "private_channel_id": private_channel.id,
+        "waiting_channel_id": waiting_channel.id
+    }
+    insert_result = get_database()['private_vcs'].insert_one(dict(private_vc))
+
+    # Check if the insert succeeded
+    if insert_result.acknowledged == False:
+        _log_to_database(guild, f'Failed to add private VC "{private_channel.name}" (id={private_channel.id}) to the database.')
+        return None
+
+    return private_vc
+
+
+def _claim_database_private_vc(owner: Member, private_channel_id: int) -> bool:
+    """Blocking implementation of claim_database_private_vc()."""
+    update_result = get_database()['private_vcs'].update_one(
+        {"private_channel_id": private_channel_id},
+        {"$set": {"owner_id": owner.id}}
     )
 
+    # Check if the update succeeded
+    if update_result.acknowledged == False:
+        _log_to_database(owner.guild, f'Failed to set the owner of private VC (id={private_channel_id}) in the database.')
+        return False
 
-def add_database_member(member: Member) -> bool:
-    """
-    Adds a member to the database. 
-    
-    Returns True if successful, and False if unsuccessful.
-    """
-    # Update database
-    updated = update_database_guild(
-        member.guild,
-        {"$push": {"member_data": {
-            "member_id": member.id,
-            "counted": 0
-        }}},
-        f'Failed to add member "{member.name}" (id={member.id}) to the database.'
+    return True
+
+
+def _delete_database_private_vc(guild: Guild, private_channel_id: int) -> bool:
+    """Blocking implementation of delete_database_private_vc()."""
+    delete_result = get_database()['private_vcs'].delete_one({"private_channel_id": private_channel_id})
+
+    # Check if the delete succeeded
+    if delete_result.acknowledged == False:
+        _log_to_database(guild, f'Failed to delete private VC (id={private_channel_id}) from the database.')
+        return False
+
+    return True
+
+
+def _add_database_member(member: Member) -> bool:
+    """Blocking implementation of add_database_member()."""
+    return _add_database_members(member.guild, [member])
+
+
+def _add_database_members(guild: Guild, members: list[Member]) -> bool:
+    """Blocking implementation of add_database_members()."""
+    # Members who already have a document, such as members who rejoin, keep their counts
+    try:
+        get_database()['members'].bulk_write([
+            UpdateOne(
+                {"guild_id": guild.id, "member_id": member.id},
+                {"$setOnInsert": {"counted": 0}},
+                upsert=True
+            )
+            for member in members
+        ], ordered=False)
+    except PyMongoError:
+        _log_to_database(guild, f'Failed to add {len(members)} members to the database.')
+        return False
+
+    return True
+
+
+def _flush_member_counts() -> bool:
+    """Blocking implementation of flush_member_counts()."""
+    global _pending_member_counts
+    with _pending_member_counts_lock:
+        pending, _pending_member_counts = _pending_member_counts, {}
+    if not pending:
+        return True
+
+    keys = list(pending)
+    try:
+        get_database()['members'].bulk_write([
+            UpdateOne(
+                {"guild_id": guild_id, "member_id": member_id},
+                {"$inc": {"counted": pending[(guild_id, member_id)]}},
+                upsert=True
+            )
+            for guild_id, member_id in keys
+        ], ordered=False)
+    except PyMongoError as e:
+        print(f'Failed to write {len(pending)} member counts to the database: {e}')
+
+        # Put the increments that were not written back so the next flush retries them
+        if isinstance(e, BulkWriteError):
+            keys = [keys[error['index']] for error in e.details['writeErrors']]
+        with _pending_member_counts_lock:
+            for key in keys:
+                _pending_member_counts[key] = _pending_member_counts.get(key, 0) + pending[key]
+        return False
+
+    with _pending_member_counts_lock:
+        member_count_stats['flushed'] += sum(pending.values())
+        member_count_stats['writes'] += len(pending)
+        member_count_stats['flushes'] += 1
+
+    return True
+
+
+def _get_top_member_counts(guild: Guild, skip: int, limit: int) -> list:
+    """Blocking implementation of get_top_member_counts()."""
+    return list(get_database()['members'].find(
+        {"guild_id": guild.id},
+        {"_id": False, "member_id": True, "counted": True}
+    ).sort([("counted", DESCENDING), ("member_id", ASCENDING)]).skip(skip).limit(limit))
+
+
+def _get_member_rank(member: Member) -> tuple:
+    """Blocking implementation of get_member_rank()."""
+    members = get_database()['members']
+    member_data = members.find_one(
+        {"guild_id": member.guild.id, "member_id": member.id},
+        {"_id": False, "counted": True}
     )
-    
-    return updated
+    if member_data is None:
+        return None
 
+    # Only counts the index entries above the member
+    ahead = members.count_documents({"guild_id": member.guild.id, "counted": {"$gt": member_data['counted']}})
+    return member_data['counted'], ahead + 1
 
-def add_database_guild(guild: Guild) -> bool:
-    """
-    Adds a guild to the database. 
-    
-    Returns True if successful, and False if unsuccessful.
-    """
+
+def _count_database_members(guild: Guild) -> int:
+    """Blocking implementation of count_database_members()."""
+    return get_database()['members'].count_documents({"guild_id": guild.id})
+
+
+def _reset_member_counts(guild: Guild) -> bool:
+    """Blocking implementation of reset_member_counts()."""
+    update_result = get_database()['members'].update_many(
+        {"guild_id": guild.id},
+        {"$set": {"counted": 0}}
+    )
+
+    # Check if the update succeeded
+    if update_result.acknowledged == False:
+        _log_to_database(guild, 'Failed to reset the count database.')
+        return False
+
+    return True
+
+
+def _add_database_guild(guild: Guild) -> bool:
+    """Blocking implementation of add_database_guild()."""
     update_result = get_database()['guilds'].insert_one({
         "guild_id": guild.id,
         "welcome_channel_id": 0,
         "welcome_message": "",
         "welcome_role_id": guild.default_role.id,
         "leave_channel_id": 0,
+        "counting_channel_id": 0,
+        "around_the_world_channel_id": 0,
         "banned_words": [],
-        "reaction_roles": [],
-        "member_data": [],
-        "logs": []
+        "banned_words_mode": "substring",
+        "reaction_roles": []
     })
+    get_guild_cache().pop(guild.id)
+
     # Check if the update succeeded
     if update_result.acknowledged == False:     
         print(f'Failed to add guild "{guild.name}" (id={guild.id}) to the database.')
@@ -0,0 +1,100 @@
+import asyncio
+import time
+import traceback
+
+from discord.message import Message
+from utils.database import get_guild_fields
+from utils.routing import get_channel_kind
+
+
+class MessageContext:
+    """Information about a message that is computed once and shared by every message handler."""
+
+    def __init__(self, channel_kind: str, is_moderator: bool, guild_data=None):
+        self.channel_kind = channel_kind  # Kind of special channel the message was sent in or None
+        self.is_moderator = is_moderator  # Whether the author has the Manage Messages permission
+        self.guild_data = guild_data      # Guild document with the fields the handlers need, if any
+
+
+class MessageHandler:
+    """A coroutine that handles messages, and the messages it applies to."""
+
+    def __init__(self, func, channel_kind=None, ignore_bots=False, ignore_moderators=False, guild_fields=()):
+        self.func = func
+        self.name = func.__qualname__
+        self.channel_kind = channel_kind
+        self.ignore_bots = ignore_bots
+        self.ignore_moderators = ignore_moderators
+        self.guild_fields = guild_fields
+
+    def applies_to(self, message: Message, context: MessageContext) -> bool:
+        """Returns True if the handler should run for the message."""
+        if self.channel_kind is not None and self.channel_kind != context.channel_kind:
+            return False
+        if self.ignore_bots and message.author.bot:
+            return False
+        if self.ignore_moderators and context.is_moderator:
+            return False
+
+        return True
+
+
+class MessageDispatcher:
+    """
+    Replaces separate on_message listeners in every cog.
+
+    The context of a guild message is computed once, with only the guild document fields the handlers need, then only the handlers that apply to the message run,
+    concurrently. The time spent in each handler is recorded in stats.
+    """
+
+    def __init__(self):
+        self.handlers = []
+        self.stats = {}
+
+    def add_handler(self, func, **kwargs) -> None:
+        """Registers a coroutine taking a message and a MessageContext. See MessageHandler for the options."""
+        self.handlers.append(MessageHandler(func, **kwargs))
+
+    def remove_handler(self, func) -> None:
+        """Unregisters a coroutine."""
+        self.handlers = [handler for handler in self.handlers if handler.func != func]
+
+    async def dispatch(self, message: Message) -> None:
+        """Runs every handler that applies to a guild message."""
+        if message.guild is None:
+            return
+
+        permissions = getattr(message.author, 'guild_permissions', None)
+        context = MessageContext(
+            channel_kind=get_channel_kind(message.channel.id),
+            is_moderator=permissions is not None and permissions.manage_messages
+        )
+
+        handlers = [handler for handler in self.handlers if handler.applies_to(message, context)]
+        if not handlers:
+            return
+
+        guild_fields = {field for handler in handlers for field in handler.guild_fields}
+        if guild_fields:
+            context.guild_data = await get_guild_fields(message.guild, *guild_fields)
+
+        await asyncio.gather(*(self.run_handler(handler, message, context) for handler in handlers))
+
+    async def run_handler(self, handler: MessageHandler, message: Message, context: MessageContext) -> None:
+        """Runs a handler, recording how long it took and printing any exception like discord.py does for listeners."""
+        start = time.perf_counter()
+        try:
+            await handler.func(message, context)
+        except Exception:
+            print(f'Ignoring exception in message handler {handler.name}')
+            traceback.print_exc()
+            errors = 1
+        else:
+            errors = 0
+
+        elapsed = time.perf_counter() - start
+        stats = self.stats.setdefault(handler.name, {'calls': 0, 'errors': 0, 'total_time': 0.0, 'max_time': 0.0})
+        stats['calls'] += 1
+        stats['errors'] += errors
+        stats['total_time'] += elapsed
+        stats['max_time'] = max(stats['max_time'], elapsed)
@@ -0,0 +1,120 @@
+import re
+import unicodedata
+
+
+# Characters that are removed or replaced before matching. Covers invisible characters,
+# common Cyrillic and Greek lookalikes of Latin letters, and leetspeak symbols.
+_CHARACTER_MAP = str.maketrans({
+    # Invisible characters
+    '\u00ad': None, '\u034f': None, '\u180e': None, '\u200b': None, '\u200c': None,
+    '\u200d': None, '\u2060': None, '\u2061': None, '\u2062': None, '\u2063': None,
+    '\u2064': None, '\ufeff': None,
+    # Cyrillic
+    'а': 'a', 'в': 'b', 'е': 'e', 'з': 'e', 'і': 'i', 'ј': 'j', 'к': 'k',
+    'м': 'm', 'н': 'h', 'о': 'o', 'р': 'p', 'с': 'c', 'т': 't', 'у': 'y', 'х': 'x', 'ѕ': 's',
+    'ԁ': 'd', 'ԛ': 'q', 'ԝ': 'w',
+    # Greek
+    'α': 'a', 'β': 'b', 'ε': 'e', 'η': 'n', 'ι': 'i', 'κ': 'k', 'ν': 'v', 'ο': 'o', 'ρ': 'p',
+    'τ': 't', 'υ': 'u', 'χ': 'x', 'ω': 'w',
+    # Leetspeak
+    '@': 'a', '$': 's',
+})
+# Leetspeak digits, only replaced in words that also have letters, so numbers such as counts are left alone
+_LEET_DIGITS = str.maketrans({'0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '8': 'b'})
+_LEET_WORD = re.compile(r'\b\w*[^\W\d_]\w*\b')
+# Mentions of users, roles and channels, and custom emojis, whose ids would otherwise be read as leetspeak
+_DISCORD_TOKENS = re.compile(r'<(?:@[!&]?|#)\d+>|<a?:\w+:\d+>')
+_COMBINING_MARKS = re.compile(r'[\u0300-\u036f\u1ab0-\u1aff\u1dc0-\u1dff\u20d0-\u20ff\ufe20-\ufe2f]+')
+_PUNCTUATION = re.compile(r'[^\w\s]+|_+')
+_WHITESPACE = re.compile(r'\s+')
+_SPACED_LETTERS = re.compile(r'(?<!\w)\w(?: \w(?!\w))+')
+
+
+def normalize(text: str) -> str:
+    """
+    Normalizes text so that banned words can't be evaded by changing how they are written.
+
+    Removes mentions and custom emojis, folds case, compatibility characters and accents, maps lookalike
+    characters to letters, removes invisible characters, turns punctuation into spaces, joins spaced out letters
+    ("b a d" becomes "bad"), then maps leetspeak digits to letters in words that have letters ("b4d" becomes "bad").
+    """
+    text = _DISCORD_TOKENS.sub(' ', text)
+    text = unicodedata.normalize('NFKD', text).casefold()
+    text = _COMBINING_MARKS.sub('', text).translate(_CHARACTER_MAP)
+    text = _PUNCTUATION.sub(' ', text)
+    text = _WHITESPACE.sub(' ', text).strip()
+    text = _SPACED_LETTERS.sub(lambda match: match.group().replace(' ', ''), text)
+    return _LEET_WORD.sub(lambda match: match.group().translate(_LEET_DIGITS), text)
+
+
+def compile_words(words: list[str], whole_words=False) -> re.Pattern:
+    """
+    Compiles words into a single pattern that finds any of them in one pass over a normalized text.
+
+    The words are normalized and merged into a trie before being turned into a pattern, so at every position
+    of the text the regex engine follows at most one branch per character instead of trying every word.
+    If whole_words is True, words only match when they are not part of a longer word.
+
+    Returns the Pattern or None if there are no words.
+    """
+    trie = {}
+    for word in words:
+        word = normalize(word)
+        if not word:
+            continue
+
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    if not trie:
+        return None
+
+    if whole_words:
+        return re.compile(r'(?<!\w)' + _trie_to_pattern(trie, whole_words) + r'(?!\w)')
+
+    return re.compile(_trie_to_pattern(trie, whole_words))
+
+
+def _trie_to_pattern(node: dict, whole_words: bool) -> str:
+    """Returns a regex matching any word in the trie rooted at node."""
+    # A word ends here, and for a substring search any longer word starting with it is redundant
+    if '' in node and not whole_words:
+        return ''
+
+    alternatives = [re.escape(char) + _trie_to_pattern(child, whole_words) for char, child in sorted(node.items()) if char]
+    if not alternatives:
+        return ''
+
+    pattern = alternatives[0] if len(alternatives) == 1 else '(?:' + '|'.join(alternatives) + ')'
+    if '' in node:
+        return '(?:' + pattern + ')?'
+
+    return pattern
+
+
+class WordMatcher:
+    """Keeps one compiled pattern per guild, recompiling it only when the guild's words or match mode change."""
+
+    def __init__(self):
+        self._patterns = {}
+
+    def get_pattern(self, guild_id: int, words: list[str], whole_words=False) -> re.Pattern:
+        """Returns the compiled pattern for the guild's words or None if there are no words."""
+        cached = self._patterns.get(guild_id)
+        if cached is not None and cached[1] == whole_words and (cached[0] is words or cached[0] == words):
+            self._patterns[guild_id] = (words, whole_words, cached[2])
+            return cached[2]
+
+        pattern = compile_words(words, whole_words)
+        self._patterns[guild_id] = (words, whole_words, pattern)
+        return pattern
+
+    def matches(self, guild_id: int, words: list[str], text: str, whole_words=False) -> bool:
+        """Returns True if the normalized text contains any of the guild's words."""
+        pattern = self.get_pattern(guild_id, words, whole_words)
+        if pattern is None:
+            return False
+
+        return pattern.search(normalize(text)) is not None
@@ -1,9 +1,13 @@
 from discord.channel import TextChannel
 from discord.errors import Forbidden, HTTPException, NotFound
-from discord.message import Message
+from discord.message import Message, PartialMessage
+from discord.raw_models import RawMessageUpdateEvent
+from typing import Union
 from utils.database import log_to_database
+from utils.metrics import instrument
 
 
+@instrument('discord')
 async def send_message(channel: TextChannel, content=None, *, tts=False, embed=None, file=None, files=None, delete_after=None, nonce=None, allowed_mentions=None, reference=None, mention_author=None) -> Message:
     """
     Wrapper for discord.py channel.send() 
@@ -24,27 +28,29 @@ async def send_message(channel: TextChannel, content=None, *, tts=False, embed=N
             mention_author=mention_author
         )
     except HTTPException as e:
-        log_to_database(channel.guild, f'[{e.status} {e.response.reason}] Failed to send a message.')
+        await log_to_database(channel.guild, f'[{e.status} {e.response.reason}] Failed to send a message.')
         return None
     except Forbidden as e:
-        log_to_database(channel.guild, f'[{e.status} {e.response.reason}] Did not have permission to send a message.')
+        await log_to_database(channel.guild, f'[{e.status} {e.response.reason}] Did not have permission to send a message.')
         return None
 
     return message
 
 
-async def delete_message(message: Message) -> None:
+@instrument('discord')
+async def delete_message(message: Union[Message, PartialMessage]) -> None:
     """Wrapper for discord.py message.delete()"""
     try:
         await message.delete()
     except Forbidden as e:
-        log_to_database(message.guild, f'[{e.status} {e.response.reason}] Did not have permission to delete a message.')
+        await log_to_database(message.guild, f'[{e.status} {e.response.reason}] Did not have permission to delete a message.')
     except NotFound as e:
-        log_to_database(message.guild, f'[{e.status} {e.response.reason}] A message "{message.content}" (id={message.id}) could not be found.')
+        await log_to_database(message.guild, f'[{e.status} {e.response.reason}] A message (id={message.id}) could not be found.')
     except HTTPException as e:
-        log_to_database(message.guild, f'[{e.status} {e.response.reason}] Failed to delete a message.')
+        await log_to_database(message.guild, f'[{e.status} {e.response.reason}] Failed to delete a message.')
 
 
+@instrument('discord')
 async def get_message(channel: TextChannel, message_id: int) -> Message:
     """
     Wrapper for discord.py channel.fetch_message() 
@@ -54,14 +60,36 @@ async def get_message(channel: TextChannel, message_id: int) -> Message:
     try:
         message = await channel.fetch_message(message_id)
     except NotFound as e:
-        log_to_database(channel.guild, f'[{e.status} {e.response.reason}] A message (id={message_id}) could not be found.')
+        await log_to_database(channel.guild, f'[{e.status} {e.response.reason}] A message (id={message_id}) could not be found.')
         return None
     except Forbidden as e:
-        log_to_database(channel.guild, f'[{e.status} {e.response.reason}] Did not have permission to get a message (id={message_id}).')
+        await log_to_database(channel.guild, f'[{e.status} {e.response.reason}] Did not have permission to get a message (id={message_id}).')
         return None
     except HTTPException as e:
-        log_to_database(channel.guild, f'[{e.status} {e.response.reason}] Failed to get a message (id={message_id}).')
+        await log_to_database(channel.guild, f'[{e.status} {e.response.reason}] Failed to get a message (id={message_id}).')
         return None
 
     return message
 
+
+def is_content_edit(payload: RawMessageUpdateEvent) -> bool:
+    """
+    Returns True if a message edit changed the content of the message.
+
+    Updates sent when Discord adds embeds to a message, or when a message is pinned, do not change the content.
+    """
+    if 'content' not in payload.data:
+        return False
+
+    if payload.cached_message is not None and payload.cached_message.content == payload.data['content']:
+        return False
+
+    return True
+
+
+def get_edited_message(channel: TextChannel, payload: RawMessageUpdateEvent) -> Union[Message, PartialMessage]:
+    """Returns the cached message of an edit, or a PartialMessage that can be used without fetching it."""
+    if payload.cached_message is not None:
+        return payload.cached_message
+
+    return channel.get_partial_message(payload.message_id)
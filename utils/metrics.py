@@ -0,0 +1,235 @@
+import functools
+import logging
+import threading
+import time
+
+from aiohttp import web
+from discord.errors import HTTPException
+from pymongo import monitoring
+
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Descriptions of the metric families, by name
+_FAMILIES = {
+    'muskrat_listener_duration_seconds': ('histogram', 'Time from dispatching an event to its listener returning.'),
+    'muskrat_listener_errors_total': ('counter', 'Exceptions raised by event listeners.'),
+    'muskrat_call_duration_seconds': ('histogram', 'Time spent in Discord wrappers and database functions.'),
+    'muskrat_call_errors_total': ('counter', 'Exceptions raised by Discord wrappers and database functions.'),
+    'muskrat_rest_duration_seconds': ('histogram', 'Time spent in Discord REST requests, including rate limit waits.'),
+    'muskrat_rest_requests_total': ('counter', 'Discord REST requests by response status.'),
+    'muskrat_rest_rate_limits_total': ('counter', 'Discord REST responses with status 429.'),
+    'muskrat_mongo_command_duration_seconds': ('histogram', 'Time spent in MongoDB commands.'),
+    'muskrat_mongo_command_failures_total': ('counter', 'Failed MongoDB commands.')
+}
+
+_metrics_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+# Dicts of stats kept by other modules, exported as gauges, by metric name prefix
+_stats = {}
+
+
+class Histogram:
+    """Counts observations in cumulative latency buckets, like a Prometheus histogram."""
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.buckets[index] += 1
+        self.count += 1
+        self.sum += value
+
+
+def observe(metric: str, value: float, **labels) -> None:
+    """Adds an observation to a histogram."""
+    key = (metric, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(value)
+
+
+def increment(metric: str, amount=1, **labels) -> None:
+    """Adds amount to a counter."""
+    key = (metric, tuple(sorted(labels.items())))
+    with _metrics_lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def add_stats(prefix: str, stats) -> None:
+    """
+    Exports a dict of stats, or a function returning one, as gauges named 'muskrat_[prefix]_[key]'.
+
+    Values that are dicts of stats themselves are exported with their key as the 'name' label.
+    """
+    _stats[prefix] = stats
+
+
+def instrument(kind: str):
+    """Decorator that records the latency and exceptions of a coroutine function, labelled with kind and its name."""
+    def decorator(func):
+        name = func.__name__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                increment('muskrat_call_errors_total', kind=kind, name=name)
+                raise
+            finally:
+                observe('muskrat_call_duration_seconds', time.perf_counter() - start, kind=kind, name=name)
+
+        return wrapper
+    return decorator
+
+
+def timed_listener(func):
+    """Returns an event listener that records the time from now until it returns, and its exceptions."""
+    name = getattr(func, '__qualname__', repr(func))
+    scheduled_at = time.perf_counter()
+
+    async def listener(*args, **kwargs):
+        try:
+            await func(*args, **kwargs)
+        except Exception:
+            increment('muskrat_listener_errors_total', listener=name)
+            raise
+        finally:
+            observe('muskrat_listener_duration_seconds', time.perf_counter() - scheduled_at, listener=name)
+
+    listener.__qualname__ = name
+    return listener
+
+
+def instrument_http(http) -> None:
+    """Records the latency and response status of every REST request of a discord.py HTTPClient."""
+    request = http.request
+
+    @functools.wraps(request)
+    async def instrumented(route, **kwargs):
+        start = time.perf_counter()
+        status = 200
+        try:
+            return await request(route, **kwargs)
+        except HTTPException as e:
+            status = e.status
+            raise
+        finally:
+            observe('muskrat_rest_duration_seconds', time.perf_counter() - start, method=route.method, route=route.path)
+            increment('muskrat_rest_requests_total', method=route.method, route=route.path, status=status)
+
+    http.request = instrumented
+    logging.getLogger('discord.http').addHandler(_RateLimitHandler())
+
+
+class _RateLimitHandler(logging.Handler):
+    """Counts the 429 responses discord.py logs before retrying a request."""
+
+    def emit(self, record):
+        if record.msg.startswith('We are being rate limited'):
+            # Buckets look like '[channel id]:[guild id]:[route]'
+            increment('muskrat_rest_rate_limits_total', route=str(record.args[1]).split(':', 2)[-1], scope='route')
+        elif record.msg.startswith('Global rate limit'):
+            increment('muskrat_rest_rate_limits_total', route='', scope='global')
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Records the latency and failures of the commands pymongo sends to MongoDB."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        observe('muskrat_mongo_command_duration_seconds', event.duration_micros / 1e6, command=event.command_name)
+
+    def failed(self, event):
+        observe('muskrat_mongo_command_duration_seconds', event.duration_micros / 1e6, command=event.command_name)
+        increment('muskrat_mongo_command_failures_total', command=event.command_name)
+
+
+def render() -> str:
+    """Returns every metric in the Prometheus text format."""
+    lines = []
+    with _metrics_lock:
+        histograms = {key: (list(histogram.buckets), histogram.count, histogram.sum) for key, histogram in _histograms.items()}
+        counters = dict(_counters)
+
+    for family, (metric_type, description) in _FAMILIES.items():
+        lines.append(f'# HELP {family} {description}')
+        lines.append(f'# TYPE {family} {metric_type}')
+
+        for (name, labels), value in sorted(counters.items()):
+            if name == family:
+                lines.append(f'{family}{_format_labels(labels)} {value}')
+
+        for (name, labels), (buckets, count, total) in sorted(histograms.items()):
+            if name != family:
+                continue
+            for bound, bucket_count in zip(LATENCY_BUCKETS, buckets):
+                lines.append(f'{family}_bucket{_format_labels(labels + (("le", bound),))} {bucket_count}')
+            lines.append(f'{family}_bucket{_format_labels(labels + (("le", "+Inf"),))} {count}')
+            lines.append(f'{family}_sum{_format_labels(labels)} {total}')
+            lines.append(f'{family}_count{_format_labels(labels)} {count}')
+
+    # Lines of the same metric must be grouped together
+    gauges = {}
+    for prefix, stats in sorted(_stats.items()):
+        stats = stats() if callable(stats) else stats
+        for key, value in sorted(stats.items()):
+            if isinstance(value, dict):
+                for stat, stat_value in sorted(value.items()):
+                    gauges.setdefault(f'muskrat_{prefix}_{stat}', []).append(((("name", key),), stat_value))
+            else:
+                gauges.setdefault(f'muskrat_{prefix}_{key}', []).append(((), value))
+
+    for gauge, values in gauges.items():
+        lines.append(f'# TYPE {gauge} gauge')
+        for labels, value in values:
+            lines.append(f'{gauge}{_format_labels(labels)} {value}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels: tuple) -> str:
+    """Returns labels in the Prometheus text format."""
+    if not labels:
+        return ''
+
+    escaped = []
+    for name, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{name}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+class MetricsServer:
+    """Serves the metrics on http://[host]:[port]/metrics for Prometheus to scrape."""
+
+    def __init__(self):
+        self.runner = None
+
+    async def start(self, host: str, port: int) -> None:
+        app = web.Application()
+        app.router.add_get('/metrics', self.metrics)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+
+    async def stop(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def metrics(self, request):
+        return web.Response(body=render().encode(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
@@ -0,0 +1,144 @@
+import copy
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import re
+import time
+
+
+# Events are written as a gzip member every RECORDING_FLUSH_INTERVAL seconds or RECORDING_FLUSH_SIZE events,
+# so a recording cut short by a crash is readable up to the last member
+RECORDING_FLUSH_INTERVAL = 5
+RECORDING_FLUSH_SIZE = 1000
+
+# Fields removed from recorded events, since they are personal and no cog reads them
+_DROPPED_FIELDS = {'attachments', 'embeds', 'activities', 'client_status', 'presences', 'avatar', 'banner', 'email', 'premium_since'}
+_USER_OBJECT_FIELDS = {'user', 'author', 'mentions', 'recipients'}
+_USER_ID_FIELDS = {'user_id', 'owner_id'}
+
+# Names of the private VC channels, which end with the name of their owner
+_PRIVATE_VC_NAME = re.compile(r'((?:Private|Waiting) - )(.*)', re.DOTALL)
+
+# Message contents that are kept, since cogs behave differently for them
+_KEPT_CONTENT = re.compile(r'\s*(\d+|around the world)\s*', re.IGNORECASE)
+_WORD_CHARACTERS = re.compile(r'\w')
+
+
+class GatewayRecorder:
+    """
+    Writes the gateway dispatches a bot receives to a gzip compressed NDJSON file, to be replayed by benchmarks/replay.py.
+
+    Every process writes a new file, named after path with the start time and process id, see get_recording_path().
+    Every line has the event name 't', its data 'd', and the 'time' in seconds since recording started.
+    Events are anonymised: user ids, including those of member permission overwrites, are replaced with pseudonyms
+    that are consistent within a recording, names, private VC channel names and message contents are scrambled,
+    and attachments, embeds and presences are removed.
+    """
+
+    def __init__(self, bot, path: str):
+        self.path = get_recording_path(path)
+        self.file = open(self.path, 'xb')
+        self.lines = []
+        self.start = time.monotonic()
+        self.salt = os.urandom(16)
+        self.events = 0
+        print(f'Recording gateway traffic to {self.path}.')
+
+        self.loop = bot.loop
+        self.flush_timer = self.loop.call_later(RECORDING_FLUSH_INTERVAL, self.flush_periodically)
+
+        # Record each dispatch before discord.py parses it, since parsers modify the data
+        parsers = bot._connection.parsers
+        for event, parser in parsers.items():
+            parsers[event] = self.recording(event, parser)
+
+    def recording(self, event: str, parser):
+        """Returns parser, recording the data of every dispatch first."""
+        def record(data):
+            self.record(event, data)
+            return parser(data)
+        return record
+
+    def record(self, event: str, data: dict) -> None:
+        """Writes an anonymised event to the recording."""
+        if self.file is None:
+            return
+
+        line = {"time": round(time.monotonic() - self.start, 6), "t": event, "d": self.anonymise(copy.deepcopy(data))}
+        self.lines.append(json.dumps(line, separators=(',', ':')) + '\n')
+        self.events += 1
+
+        if len(self.lines) >= RECORDING_FLUSH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes the buffered events to the file as a complete gzip member."""
+        if self.file is None or not self.lines:
+            return
+
+        self.file.write(gzip.compress(''.join(self.lines).encode('utf-8')))
+        self.file.flush()
+        self.lines = []
+
+    def flush_periodically(self) -> None:
+        """Flushes the buffered events every RECORDING_FLUSH_INTERVAL seconds until the recording is closed."""
+        self.flush()
+        if self.file is not None:
+            self.flush_timer = self.loop.call_later(RECORDING_FLUSH_INTERVAL, self.flush_periodically)
+
+    def close(self) -> None:
+        """Finishes the recording."""
+        if self.file is not None:
+            self.flush_timer.cancel()
+            self.flush()
+            self.file.close()
+            self.file = None
+
+    def anonymise(self, value, key=None):
+        """Returns value with the personal data of users replaced."""
+        if isinstance(value, list):
+            return [self.anonymise(item, key) for item in value]
+        if not isinstance(value, dict):
+            return value
+
+        if key in _USER_OBJECT_FIELDS:
+            user_id = self.pseudonym(value['id'])
+            return {"id": user_id, "username": f'user{user_id[-4:]}', "discriminator": '0000', "avatar": None, "bot": value.get('bot', False)}
+
+        # Member overwrites have the id of the member, role overwrites the id of the role
+        if key == 'permission_overwrites' and value.get('type') in (1, 'member'):
+            value['id'] = self.pseudonym(value['id'])
+
+        for field, item in value.items():
+            if field in _DROPPED_FIELDS:
+                value[field] = [] if isinstance(item, list) else None
+            elif field in _USER_ID_FIELDS and item is not None:
+                value[field] = self.pseudonym(item)
+            elif field == 'nick':
+                value[field] = None
+            elif field == 'content' and isinstance(item, str) and not _KEPT_CONTENT.fullmatch(item):
+                value[field] = _WORD_CHARACTERS.sub('x', item)
+            elif field == 'name' and isinstance(item, str) and _PRIVATE_VC_NAME.fullmatch(item):
+                prefix, owner_name = _PRIVATE_VC_NAME.fullmatch(item).groups()
+                value[field] = prefix + _WORD_CHARACTERS.sub('x', owner_name)
+            else:
+                value[field] = self.anonymise(item, field)
+
+        return value
+
+    def pseudonym(self, user_id) -> str:
+        """Returns the id that replaces a user id in this recording."""
+        digest = hmac.new(self.salt, str(user_id).encode(), hashlib.sha256).digest()
+        return str(int.from_bytes(digest[:8], 'big') >> 1)
+
+
+def get_recording_path(path: str) -> str:
+    """Returns path with the current time and process id before its extensions, such as 'recording-20240101-120000-1234.ndjson.gz'."""
+    base, extensions = path, ''
+    for extension in ('.gz', '.ndjson'):
+        if base.endswith(extension):
+            base, extensions = base[:-len(extension)], extension + extensions
+
+    return f'{base}-{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}{extensions}'
@@ -1,9 +1,29 @@
+import asyncio
+import os
+import time
+
+from collections import defaultdict
 from discord.ext import commands
 from discord.ext.commands.errors import BadArgument, CommandError
 from discord.errors import Forbidden, HTTPException
 from discord.member import Member
 from discord.role import Role
 from utils.database import log_to_database
+from utils.metrics import add_stats, instrument
+
+
+# Queued role changes by (guild id, member id), each with role ids mapped to True to give the role or False to remove it
+_pending_role_changes = {}
+_guild_role_locks = defaultdict(asyncio.Lock)
+role_queue_stats = {
+    'queued': 0,          # Role changes queued
+    'coalesced': 0,       # Role changes merged into a member's pending edit
+    'edits': 0,           # Role edits sent to Discord
+    'skipped': 0,         # Pending edits dropped because the changes cancelled out
+    'total_latency': 0.0, # Seconds between the first queued change and the edit, summed over all edits
+    'max_latency': 0.0
+}
+add_stats('role_queue', lambda: dict(role_queue_stats, depth=get_role_queue_depth()))
 
 
 async def convert_to_role(ctx, arg) -> Role:
@@ -22,22 +42,107 @@ async def convert_to_role(ctx, arg) -> Role:
     return role
 
 
+@instrument('discord')
 async def give_member_role(member: Member, *roles: list[Role]) -> None:
     """Wrapper for discord.py member.add_roles()"""
     try:
         await member.add_roles(*roles)
     except Forbidden as e:
-        log_to_database(member.guild, f'[{e.status} {e.response.reason}] Did not have permission to add roles.')
+        await log_to_database(member.guild, f'[{e.status} {e.response.reason}] Did not have permission to add roles.')
     except HTTPException as e:
-        log_to_database(member.guild, f'[{e.status} {e.response.reason}] Failed to add roles.')
+        await log_to_database(member.guild, f'[{e.status} {e.response.reason}] Failed to add roles.')
 
 
+@instrument('discord')
 async def remove_member_role(member: Member, *roles: list[Role]) -> None:
     """Wrapper for discord.py member.remove_roles()"""
     try:
         await member.remove_roles(*roles)
     except Forbidden as e:
-        log_to_database(member.guild, f'[{e.status} {e.response.reason}] Did not have permission to remove roles.')
+        await log_to_database(member.guild, f'[{e.status} {e.response.reason}] Did not have permission to remove roles.')
     except HTTPException as e:
-        log_to_database(member.guild, f'[{e.status} {e.response.reason}] Failed to remove roles.')  
+        await log_to_database(member.guild, f'[{e.status} {e.response.reason}] Failed to remove roles.')  
+
+
+
+@instrument('discord')
+async def edit_member_roles(member: Member, roles: list[Role]) -> None:
+    """Wrapper for discord.py member.edit(roles=...)"""
+    try:
+        await member.edit(roles=roles)
+    except Forbidden as e:
+        await log_to_database(member.guild, f'[{e.status} {e.response.reason}] Did not have permission to edit roles.')
+    except HTTPException as e:
+        await log_to_database(member.guild, f'[{e.status} {e.response.reason}] Failed to edit roles.')
+
+
+def queue_member_role(member: Member, role: Role, add: bool) -> None:
+    """
+    Queues giving a role to or removing a role from a member.
+
+    Changes to the same member within ROLE_QUEUE_DELAY seconds (default 1) are coalesced, so toggling a role back and forth
+    costs at most one request. Edits in the same guild are applied one at a time, since they share a rate limit bucket.
+    """
+    key = (member.guild.id, member.id)
+    pending = _pending_role_changes.get(key)
+    if pending is None:
+        pending = _pending_role_changes[key] = {'roles': {}, 'queued_at': time.monotonic()}
+        asyncio.ensure_future(_apply_role_changes(member, key))
+    else:
+        role_queue_stats['coalesced'] += 1
+
+    pending['roles'][role.id] = add
+    role_queue_stats['queued'] += 1
+
+
+def get_role_queue_depth() -> int:
+    """Returns the number of members with queued role changes."""
+    return len(_pending_role_changes)
+
+
+async def _apply_role_changes(member: Member, key: tuple) -> None:
+    """
+    Applies the net result of a member's queued role changes.
+
+    A single net change, which is the common case, uses the endpoint that adds or removes one role, so it can't undo
+    changes made by others that are not in the member cache yet. Several net changes are sent as one edit of the whole
+    role list, which saves requests but overwrites such changes.
+    """
+    await asyncio.sleep(float(os.environ.get('ROLE_QUEUE_DELAY', 1)))
+
+    guild = member.guild
+    async with _guild_role_locks[guild.id]:
+        pending = _pending_role_changes.pop(key)
+
+        # Use the latest roles of the member
+        member = guild.get_member(member.id)
+        if member is None:
+            return
+
+        current_roles = {role.id: role for role in member.roles if not role.is_default()}
+        added = []
+        removed = []
+        for role_id, add in pending['roles'].items():
+            role = guild.get_role(role_id)
+            if add and role is not None and role_id not in current_roles:
+                added.append(role)
+            elif not add and role_id in current_roles:
+                removed.append(current_roles[role_id])
+
+        # Skip the edit if the changes cancelled each other out
+        if not added and not removed:
+            role_queue_stats['skipped'] += 1
+        elif len(added) + len(removed) == 1:
+            if added:
+                await give_member_role(member, *added)
+            else:
+                await remove_member_role(member, *removed)
+            role_queue_stats['edits'] += 1
+        else:
+            roles = [role for role in current_roles.values() if role not in removed] + added
+            await edit_member_roles(member, roles)
+            role_queue_stats['edits'] += 1
 
+    latency = time.monotonic() - pending['queued_at']
+    role_queue_stats['total_latency'] += latency
+    role_queue_stats['max_latency'] = max(role_queue_stats['max_latency'], latency)
@@ -0,0 +1,65 @@
+import discord
+
+from discord.channel import TextChannel
+from discord.guild import Guild
+
+
+# Names used to find special channels in guilds that have not set one
+SPECIAL_CHANNEL_NAMES = {
+    'counting': 'counting',
+    'around_the_world': 'around-the-world'
+}
+
+# Kind of every special channel by channel id, and special channel ids by kind by guild id
+_channel_kinds = {}
+_guild_channels = {}
+
+
+def route_guild(guild: Guild, guild_data=None) -> None:
+    """
+    Registers the special channels of a guild.
+
+    Uses the '[kind]_channel_id' fields of the guild data when they point to an existing channel,
+    and otherwise the text channel with the default name, if there is one.
+    """
+    unroute_guild(guild)
+
+    channels = {}
+    for kind, name in SPECIAL_CHANNEL_NAMES.items():
+        channel = None
+        if guild_data:
+            channel = guild.get_channel(guild_data.get(f'{kind}_channel_id', 0))
+        if channel is None:
+            channel = discord.utils.get(guild.text_channels, name=name)
+        if channel is None:
+            continue
+
+        channels[kind] = channel.id
+        _channel_kinds[channel.id] = kind
+
+    _guild_channels[guild.id] = channels
+
+
+def unroute_guild(guild: Guild) -> None:
+    """Removes the special channels of a guild."""
+    for channel_id in _guild_channels.pop(guild.id, {}).values():
+        _channel_kinds.pop(channel_id, None)
+
+
+def get_channel_kind(channel_id: int) -> str:
+    """Returns the kind of a special channel or None if the channel is not special."""
+    return _channel_kinds.get(channel_id)
+
+
+def is_special_channel(channel_id: int, kind: str) -> bool:
+    """Returns True if the channel is the guild's special channel of that kind."""
+    return _channel_kinds.get(channel_id) == kind
+
+
+def get_special_channel(guild: Guild, kind: str) -> TextChannel:
+    """Returns the guild's special channel of that kind or None."""
+    channel_id = _guild_channels.get(guild.id, {}).get(kind)
+    if channel_id is None:
+        return None
+
+    return guild.get_channel(channel_id)